@@ -0,0 +1,86 @@
+"""
+################################################################################
+# Script Name: benchmarks/bench_domain_filter.py
+#
+# Description:
+#   Measures the per-target cost of the `--domain` filter as the number of
+#   domains grows. The host-indexed DomainFilter (set lookup plus glob
+#   suffixes, cached per host) is compared with the naive extension of the old
+#   single-prefix check: `str.startswith` against a tuple of every
+#   `https://host/` prefix. Glob entries (`*.brandN.com`) have no prefix form,
+#   so the prefix baseline only covers the exact hosts.
+#
+# Usage:
+#   python benchmarks/bench_domain_filter.py --domains 1 100 1000 10000 --urls 200000
+################################################################################
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from redirects_core import DomainFilter
+
+def make_domains(count, glob_ratio):
+    globs = int(count * glob_ratio)
+    hosts = [f"www.brand{i}.com" for i in range(count - globs)]
+    patterns = [f"*.site{i}.org" for i in range(globs)]
+    return hosts, patterns
+
+def make_urls(count, hosts, patterns, hit_ratio, other_hosts, seed=0):
+    rng = random.Random(seed)
+    urls = []
+    for i in range(count):
+        if rng.random() < hit_ratio and (hosts or patterns):
+            if patterns and (not hosts or rng.random() < 0.5):
+                host = f"shop{i % 7}." + rng.choice(patterns)[2:]
+            else:
+                host = rng.choice(hosts)
+        else:
+            host = f"www.unrelated{rng.randrange(other_hosts)}.net"
+        urls.append(f"https://{host}/path/{i}")
+    return urls
+
+def time_filter(matches, urls, repeat):
+    best = None
+    hits = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        hits = sum(1 for url in urls if matches(url))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, hits
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the --domain filter.")
+    parser.add_argument("--domains", type=int, nargs="+", default=[1, 100, 1000, 10000], help="Domain counts to test")
+    parser.add_argument("--urls", type=int, default=200000, help="Target URLs checked per run")
+    parser.add_argument("--glob-ratio", type=float, default=0.2, help="Share of domains given as *.host globs")
+    parser.add_argument("--hit-ratio", type=float, default=0.5, help="Share of URLs on a listed domain")
+    parser.add_argument("--other-hosts", type=int, default=1000, help="Distinct unlisted hosts among the other URLs")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the best is reported")
+    args = parser.parse_args()
+
+    print(f"{'domains':>8}  {'filter':<12}  {'seconds':>8}  {'ns/url':>8}  {'hits':>8}")
+    for count in args.domains:
+        hosts, patterns = make_domains(count, args.glob_ratio if count > 1 else 0)
+        urls = make_urls(args.urls, hosts, patterns, args.hit_ratio, args.other_hosts)
+
+        prefixes = tuple(f"https://{host}/" for host in hosts)
+        elapsed, hits = time_filter(lambda url: url.startswith(prefixes), urls, args.repeat)
+        print(f"{count:>8}  {'startswith':<12}  {elapsed:>8.3f}  {elapsed / len(urls) * 1e9:>8.0f}  {hits:>8}")
+
+        # A fresh filter per run so the host cache is built inside the timing.
+        best = None
+        for _ in range(args.repeat):
+            domain_filter = DomainFilter(hosts + patterns)
+            run, hits = time_filter(domain_filter.matches, urls, 1)
+            best = run if best is None else min(best, run)
+        print(f"{count:>8}  {'DomainFilter':<12}  {best:>8.3f}  {best / len(urls) * 1e9:>8.0f}  {hits:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+################################################################################
+# Script Name: benchmarks/bench_import_time.py
+#
+# Description:
+#   Checks the cold-start cost of both CLIs, and of redirects_core on its own
+#   (what embedding the engine costs), against a budget. Each module is
+#   imported in fresh interpreters under `python -X importtime`; the median
+#   cumulative import time of the module is compared with its budget,
+#   and the slowest imports of the last run are listed. It also checks that
+#   modules only some code paths need (pandas, difflib, multiprocessing,
+#   profiling and metrics modules, ...) are not loaded at import time.
+#
+# Usage:
+#   python benchmarks/bench_import_time.py
+#   python benchmarks/bench_import_time.py --runs 20 --budget update_netlify_redirects=30
+#
+# Notes:
+#   - Exits with status 1 when a budget is exceeded or a deferred module is
+#     imported eagerly, so it can gate CI.
+#   - Budgets are in milliseconds and leave headroom over a typical laptop;
+#     raise them with --budget on slow runners rather than editing them.
+################################################################################
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+IMPORT_BUDGET_MS = {
+    "redirects_core": 25,
+    "update_netlify_redirects": 40,
+    "bulk_update_redirects": 60,
+}
+
+# Loaded only on the code path that needs them.
+DEFERRED_MODULES = [
+    "pandas",
+    "csv",
+    "difflib",
+    "fnmatch",
+    "tempfile",
+    "threading",
+    "tracemalloc",
+    "cProfile",
+    "pstats",
+    "multiprocessing",
+    "concurrent.futures",
+]
+
+def import_times(module):
+    # -X importtime writes "import time: self [us] | cumulative | name" lines
+    # to stderr, nested imports indented under their parent.
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+def slowest_imports(rows, module, top):
+    # Children are listed before their parent, so the module's own imports are
+    # the rows between the previous top-level import (interpreter start-up)
+    # and the module itself.
+    end = next(i for i, row in enumerate(rows) if row[0] == module)
+    start = end
+    while start > 0 and rows[start - 1][0].startswith(" "):
+        start -= 1
+    children = sorted(rows[start:end], key=lambda row: row[2], reverse=True)
+    return [(name.strip(), cumulative_us) for name, _, cumulative_us in children[:top]]
+
+def eager_modules(module):
+    code = f"import sys, {module}; print('\\n'.join(sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    loaded = set(result.stdout.split())
+    return [name for name in DEFERRED_MODULES if name in loaded]
+
+def parse_budgets(values):
+    budgets = dict(IMPORT_BUDGET_MS)
+    for value in values:
+        module, _, ms = value.partition("=")
+        budgets[module] = float(ms)
+    return budgets
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CLI import time against a budget.")
+    parser.add_argument("--runs", type=int, default=10, help="Fresh interpreters per script; the median is compared")
+    parser.add_argument("--top", type=int, default=8, help="Slowest imports to list per script")
+    parser.add_argument("--budget", action="append", default=[], metavar="MODULE=MS", help="Override a budget")
+    args = parser.parse_args()
+
+    budgets = parse_budgets(args.budget)
+    failures = 0
+    for module, budget_ms in budgets.items():
+        totals = []
+        for _ in range(args.runs):
+            rows = import_times(module)
+            totals.append(next(cumulative for name, _, cumulative in rows if name == module) / 1000)
+        median_ms = statistics.median(totals)
+        ok = median_ms <= budget_ms
+        print(f"{'✅' if ok else '❌'} {module}: {median_ms:.1f} ms median (min {min(totals):.1f}), budget {budget_ms:g} ms")
+        if not ok:
+            failures += 1
+
+        for name, cumulative_us in slowest_imports(rows, module, args.top):
+            print(f"     {cumulative_us / 1000:>7.1f} ms  {name}")
+
+        eager = eager_modules(module)
+        if eager:
+            print(f"❌ {module} imports deferred modules at load time: {', '.join(eager)}")
+            failures += 1
+
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+################################################################################
+# Script Name: benchmarks/bench_load_csv.py
+#
+# Description:
+#   Compares the `csv` and `pandas` engines of `load_csv` on generated
+#   `old_url,new_url` files of increasing size. Reports wall time (including the
+#   engine's import cost), rows/s and peak traced memory for each engine.
+#
+# Usage:
+#   python benchmarks/bench_load_csv.py --rows 100000 1000000 5000000
+#
+# Notes:
+#   - The pandas engine is skipped when pandas is not installed.
+#   - Each engine runs in a fresh process so import cost and peak memory are
+#     measured independently.
+################################################################################
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+def write_csv(path, rows):
+    with open(path, "w") as f:
+        f.write("old_url,new_url\n")
+        for i in range(rows):
+            f.write(f"https://your-domain.com/old/{i},https://your-domain.com/new/{i}\n")
+
+def run_engine(csv_path, engine, queue):
+    from redirects_core import load_csv
+
+    # Import cost of the engine itself (pandas) is part of what is measured.
+    start = time.perf_counter()
+    url_map = load_csv(csv_path, engine)
+    elapsed = time.perf_counter() - start
+    del url_map
+
+    # Peak memory comes from a second, traced run so tracing overhead does not
+    # distort the timing above.
+    tracemalloc.start()
+    url_map = load_csv(csv_path, engine)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    queue.put((elapsed, peak, len(url_map)))
+
+def have_pandas():
+    try:
+        import pandas  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark load_csv engines.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000, 1000000], help="CSV sizes to generate")
+    args = parser.parse_args()
+
+    engines = ["csv", "pandas"] if have_pandas() else ["csv"]
+    if "pandas" not in engines:
+        print("⚠️  pandas not installed; benchmarking the csv engine only.")
+
+    print(f"{'rows':>10}  {'engine':<7}  {'seconds':>8}  {'rows/s':>12}  {'peak MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            csv_path = os.path.join(tmp, f"redirects_{rows}.csv")
+            write_csv(csv_path, rows)
+            for engine in engines:
+                queue = multiprocessing.Queue()
+                proc = multiprocessing.Process(target=run_engine, args=(csv_path, engine, queue))
+                proc.start()
+                elapsed, peak, loaded = queue.get()
+                proc.join()
+                print(f"{loaded:>10}  {engine:<7}  {elapsed:>8.3f}  {loaded / elapsed:>12,.0f}  {peak / 1e6:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+################################################################################
+# Script Name: benchmarks/bench_rule_pipeline.py
+#
+# Description:
+#   Measures the per-line cost of the two-pass streaming rewrite + pretty
+#   format with parsed `Rule` records (one split per line per pass), against
+#   the previous string pipeline that split each line, re-joined it, then
+#   split the joined line again to collect widths and to format it.
+#
+# Usage:
+#   python benchmarks/bench_rule_pipeline.py --lines 200000 --hit-ratio 0.3
+################################################################################
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from redirects_core import parse_rules, rewrite_rules, rule_widths, format_rule
+
+def make_corpus(count, hit_ratio, seed=0):
+    rng = random.Random(seed)
+    lines = []
+    url_map = {}
+    for i in range(count):
+        target = f"https://your-domain.com/old/{i}"
+        lines.append(f"/old/{i}    {target}    301\n")
+        if rng.random() < hit_ratio:
+            url_map[target] = f"https://your-domain.com/new/{i}"
+    return lines, url_map
+
+def legacy_rewrite(lines, url_map, domain_filter):
+    for line in lines:
+        parts = line.strip().split()
+        if len(parts) >= 2 and parts[1].startswith("https://"):
+            target_url = parts[1].strip()
+            if (not domain_filter or target_url.startswith(domain_filter)) and target_url in url_map:
+                parts[1] = url_map[target_url]
+            updated_line = "  ".join(parts)
+        else:
+            updated_line = line.strip()
+        yield updated_line + "\n"
+
+def legacy_format(line, max_from, max_to):
+    parts = line.split()
+    if len(parts) == 3 and parts[1].startswith("https://"):
+        return f"{parts[0].ljust(max_from + 2)}{parts[1].ljust(max_to + 2)}{parts[2]}\n"
+    return line.strip() + "\n"
+
+def legacy_pipeline(lines, url_map, domain_filter):
+    # Streaming string pipeline as it was before Rule records: every pass
+    # splits the line, re-joins it, then splits the joined line again.
+    max_from = 0
+    max_to = 0
+    for line in legacy_rewrite(lines, url_map, domain_filter):
+        parts = line.split()
+        if len(parts) == 3 and parts[1].startswith("https://"):
+            max_from = max(max_from, len(parts[0]))
+            max_to = max(max_to, len(parts[1]))
+    return [legacy_format(line, max_from, max_to) for line in legacy_rewrite(lines, url_map, domain_filter)]
+
+def rule_pipeline(lines, url_map, domain_filter):
+    # Same two streaming passes as update_redirects_file.
+    widths = rule_widths(rewrite_rules(parse_rules(lines), url_map, domain_filter))
+    return [format_rule(rule, widths) for rule in rewrite_rules(parse_rules(lines), url_map, domain_filter)]
+
+def best_of(func, repeat, *args):
+    # Like timeit, the collector is paused so retained output does not skew runs.
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the per-line cost of the rule pipeline.")
+    parser.add_argument("--lines", type=int, default=200000, help="Number of rules to generate")
+    parser.add_argument("--hit-ratio", type=float, default=0.3, help="Fraction of targets present in the URL map")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per pipeline; the best is reported")
+    args = parser.parse_args()
+
+    lines, url_map = make_corpus(args.lines, args.hit_ratio)
+    legacy_time, legacy_out = best_of(legacy_pipeline, args.repeat, lines, url_map, "")
+    rule_time, rule_out = best_of(rule_pipeline, args.repeat, lines, url_map, "")
+    if legacy_out != rule_out:
+        print("❌ Pipelines produced different output.")
+        sys.exit(1)
+
+    print(f"{'pipeline':<8}  {'total s':>8}  {'ns/line':>8}")
+    print(f"{'legacy':<8}  {legacy_time:>8.3f}  {legacy_time / args.lines * 1e9:>8.0f}")
+    print(f"{'rule':<8}  {rule_time:>8.3f}  {rule_time / args.lines * 1e9:>8.0f}")
+    print(f"Speed-up: {legacy_time / rule_time:.2f}x")
+
+if __name__ == "__main__":
+    main()
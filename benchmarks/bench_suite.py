@@ -0,0 +1,171 @@
+"""
+################################################################################
+# Script Name: benchmarks/bench_suite.py
+#
+# Description:
+#   Stage-by-stage benchmark of the redirect updater on generated corpora
+#   (see generate_corpus.py). For each corpus size it measures:
+#     - load_csv            csv engine, no cache
+#     - load_csv_cached     memory-mapped URL-map cache hit
+#     - rewrite_rules       streaming parse + rewrite pass
+#     - format_rules        width pass + pretty formatting of rewritten rules
+#     - write_diff          linear full-file diff of rewritten rules
+#     - update              end-to-end update_redirects_file (output + diff)
+#     - update_in_memory    update_redirects on lines already in memory, the
+#                           embedded API with no file I/O
+#   and optionally a bulk run of bulk_update_redirects.py over N sites.
+#
+#   Every stage runs in a fresh process and reports wall time, CPU time,
+#   throughput (rules/s) and the process's peak RSS. Setup work a stage needs
+#   (loading the map, pre-rewriting rules) is excluded from the timings but
+#   included in peak RSS.
+#
+# Usage:
+#   python benchmarks/bench_suite.py --sizes 1k 100k 1M 10M --hit-ratio 0.3
+#   python benchmarks/bench_suite.py --sizes 10k --sites 200 --workers 8 --json bench.json
+################################################################################
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from generate_corpus import generate_site, generate_tree, parse_count
+
+STAGES = ["load_csv", "load_csv_cached", "rewrite_rules", "format_rules", "write_diff", "update", "update_in_memory"]
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    rss = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def run_stage(stage, corpus_dir, queue):
+    import redirects_core as u
+
+    csv_path = os.path.join(corpus_dir, "redirects.csv")
+    redirects_path = os.path.join(corpus_dir, "_redirects")
+    cache_dir = os.path.join(corpus_dir, "cache")
+    out_path = os.path.join(corpus_dir, f"{stage}.out")
+
+    if stage == "load_csv":
+        work = lambda: u.load_csv(csv_path)
+    elif stage == "load_csv_cached":
+        u.load_csv(csv_path, cache_dir=cache_dir)
+        work = lambda: u.load_csv(csv_path, cache_dir=cache_dir)
+    else:
+        url_map = u.load_csv(csv_path)
+        if stage == "rewrite_rules":
+            def work():
+                with open(redirects_path) as f:
+                    deque(u.rewrite_rules(u.parse_rules(f), url_map, ""), maxlen=0)
+        elif stage in ("format_rules", "write_diff"):
+            with open(redirects_path) as f:
+                rules = list(u.rewrite_rules(u.parse_rules(f), url_map, ""))
+            if stage == "format_rules":
+                def work():
+                    widths = u.rule_widths(rules)
+                    with open(out_path, "w") as out:
+                        for rule in rules:
+                            out.write(u.format_rule(rule, widths))
+            else:
+                def work():
+                    with u.DiffWriter(out_path) as writer:
+                        for rule in rules:
+                            writer.add(rule)
+        elif stage == "update":
+            work = lambda: u.update_redirects_file(redirects_path, out_path, out_path + ".html", url_map, u.pipeline_options())
+        else:
+            # The embedded API on lines already in memory: no file I/O at all.
+            with open(redirects_path) as f:
+                lines = f.readlines()
+            work = lambda: deque(u.update_redirects(lines, url_map), maxlen=0)
+
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    work()
+    queue.put({
+        "wall_s": time.perf_counter() - wall,
+        "cpu_s": time.process_time() - cpu,
+        "peak_rss_mb": peak_rss_mb(),
+    })
+
+def run_bulk(projects_dir, workers, queue):
+    cmd = [sys.executable, os.path.join(REPO_DIR, "bulk_update_redirects.py"),
+           "--projects-folder", projects_dir, "--workers", str(workers), "--no-cache", "--force"]
+    wall = time.perf_counter()
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    queue.put({
+        "wall_s": time.perf_counter() - wall,
+        "cpu_s": usage.ru_utime + usage.ru_stime,
+        # Largest single process of the run; workers run side by side.
+        "peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+    })
+
+def measure(target, *args):
+    # A fresh interpreter per measurement keeps peak RSS and child rusage
+    # independent of earlier stages.
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=target, args=args + (queue,))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+def print_row(size, stage, rules, result):
+    throughput = rules / result["wall_s"] if result["wall_s"] else float("inf")
+    print(f"{size:>10}  {stage:<18}  {result['wall_s']:>8.3f}  {result['cpu_s']:>8.3f}  {throughput:>12,.0f}  {result['peak_rss_mb']:>8.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark each stage of the redirect updater.")
+    parser.add_argument("--sizes", nargs="+", default=["1k", "100k", "1M"], help="Rules per corpus (k/M suffixes allowed)")
+    parser.add_argument("--hit-ratio", type=float, default=0.3, help="Fraction of rule targets present in the CSV")
+    parser.add_argument("--domains", type=int, default=3, help="Number of distinct target domains")
+    parser.add_argument("--comment-density", type=float, default=0.02, help="Fraction of comment/blank lines")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="Stages to run")
+    parser.add_argument("--sites", type=int, default=0, help="Also benchmark a bulk run over this many sites (per size)")
+    parser.add_argument("--workers", type=int, default=1, help="Workers for the bulk run")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'rules':>10}  {'stage':<18}  {'wall s':>8}  {'cpu s':>8}  {'rules/s':>12}  {'RSS MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            rules = parse_count(size)
+            options = dict(hit_ratio=args.hit_ratio, domains=args.domains, comment_density=args.comment_density)
+            corpus_dir = os.path.join(tmp, f"corpus-{rules}")
+            generate_site(corpus_dir, rules, **options)
+            for stage in args.stages:
+                result = measure(run_stage, stage, corpus_dir)
+                print_row(rules, stage, rules, result)
+                results.append(dict(result, rules=rules, stage=stage))
+
+            if args.sites:
+                projects_dir = os.path.join(tmp, f"projects-{rules}")
+                generate_tree(projects_dir, args.sites, rules, **options)
+                result = measure(run_bulk, projects_dir, args.workers)
+                stage = f"bulk x{args.sites}"
+                print_row(rules, stage, rules * args.sites, result)
+                results.append(dict(result, rules=rules * args.sites, stage=stage, workers=args.workers))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"hit_ratio": args.hit_ratio, "domains": args.domains, "results": results}, f, indent=2)
+        print(f"📊 Results saved to {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+################################################################################
+# Script Name: benchmarks/generate_corpus.py
+#
+# Description:
+#   Deterministic synthetic corpus generator for benchmarks. Writes a Netlify
+#   `_redirects` file plus a matching `redirects.csv`, or a bulk projects tree
+#   of N site folders laid out like `bulk_update_redirects.py` expects.
+#
+# Usage:
+#   python benchmarks/generate_corpus.py --rules 1M --out /tmp/corpus
+#   python benchmarks/generate_corpus.py --rules 10k --sites 500 --out /tmp/projects
+#
+# Arguments:
+#   --rules             Rules per `_redirects` file (suffixes k/M allowed)
+#   --hit-ratio         Fraction of rule targets present in the CSV (default 0.3)
+#   --domains           Number of distinct target domains (default 3)
+#   --offsite-ratio     Fraction of targets on non-primary domains (default 0.2)
+#   --comment-density   Fraction of lines that are comments/blanks (default 0.02)
+#   --extra-csv-ratio   CSV rows that match no rule, relative to hits (default 0.5)
+#   --sites             Generate a bulk tree of this many site folders instead
+#   --seed              Random seed (default 0); same inputs give same files
+#   --out               Output directory
+################################################################################
+"""
+
+import argparse
+import os
+import random
+
+STATUSES = ["301", "301", "301", "302", "200"]
+
+def parse_count(value):
+    value = value.strip().lower()
+    scale = {"k": 1000, "m": 1000000}.get(value[-1:], 1)
+    if scale != 1:
+        value = value[:-1]
+    return int(float(value) * scale)
+
+def domain_names(count):
+    return [f"https://www.brand{i}.com" for i in range(count)]
+
+def generate_site(out_dir, rules, hit_ratio=0.3, domains=3, offsite_ratio=0.2,
+                  comment_density=0.02, extra_csv_ratio=0.5, seed=0):
+    rng = random.Random(seed)
+    hosts = domain_names(max(domains, 1))
+    os.makedirs(out_dir, exist_ok=True)
+    redirects_path = os.path.join(out_dir, "_redirects")
+    csv_path = os.path.join(out_dir, "redirects.csv")
+    hits = 0
+
+    with open(redirects_path, "w") as rf, open(csv_path, "w") as cf:
+        rf.write("# Generated _redirects corpus\n")
+        cf.write("old_url,new_url\n")
+        written = 0
+        while written < rules:
+            if rng.random() < comment_density:
+                rf.write("\n" if rng.random() < 0.5 else f"# section {written}\n")
+                continue
+            host = hosts[0] if len(hosts) == 1 or rng.random() >= offsite_ratio else rng.choice(hosts[1:])
+            section = rng.choice(("blog", "news", "products", "docs", "about"))
+            target = f"{host}/{section}/item-{written}"
+            rf.write(f"/{section}/old-{written}  {target}  {rng.choice(STATUSES)}\n")
+            if rng.random() < hit_ratio:
+                cf.write(f"{target},{host}/{section}/renamed-{written}\n")
+                hits += 1
+            written += 1
+        # Rows for URLs that no rule points at, as real mapping files have.
+        for i in range(int(hits * extra_csv_ratio)):
+            cf.write(f"{hosts[0]}/unused/{i},{hosts[0]}/unused-new/{i}\n")
+    return redirects_path, csv_path
+
+def generate_tree(root, sites, rules, seed=0, **options):
+    folders = []
+    for i in range(sites):
+        folder = os.path.join(root, f"site-{i:05d}")
+        generate_site(folder, rules, seed=seed * 100003 + i, **options)
+        folders.append(folder)
+    return folders
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic _redirects/CSV corpus.")
+    parser.add_argument("--rules", type=parse_count, default=parse_count("100k"), help="Rules per _redirects file (k/M suffixes allowed)")
+    parser.add_argument("--hit-ratio", type=float, default=0.3, help="Fraction of rule targets present in the CSV")
+    parser.add_argument("--domains", type=int, default=3, help="Number of distinct target domains")
+    parser.add_argument("--offsite-ratio", type=float, default=0.2, help="Fraction of targets on non-primary domains")
+    parser.add_argument("--comment-density", type=float, default=0.02, help="Fraction of lines that are comments or blanks")
+    parser.add_argument("--extra-csv-ratio", type=float, default=0.5, help="Unused CSV rows relative to matching rows")
+    parser.add_argument("--sites", type=int, default=0, help="Generate a bulk projects tree with this many sites")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--out", required=True, help="Output directory")
+    args = parser.parse_args()
+
+    options = dict(
+        hit_ratio=args.hit_ratio,
+        domains=args.domains,
+        offsite_ratio=args.offsite_ratio,
+        comment_density=args.comment_density,
+        extra_csv_ratio=args.extra_csv_ratio,
+    )
+    if args.sites:
+        generate_tree(args.out, args.sites, args.rules, seed=args.seed, **options)
+        print(f"✅ {args.sites} site folders with {args.rules} rules each written to {args.out}")
+    else:
+        generate_site(args.out, args.rules, seed=args.seed, **options)
+        print(f"✅ {args.rules} rules written to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -17,7 +17,7 @@
 # GitHub: https://github.com/ericrasch/netlify-redirect-updater
 # Date Created: 2025-04-09
 # Last Modified: 2025-04-09
-# Version: 1.1
+# Version: 1.2
 #
 # Usage:
 #   python bulk_update_redirects.py \
@@ -26,14 +26,66 @@
 #
 # Arguments:
 #   --projects-folder   Path to top-level directory containing subfolders
-#   --domain            (Optional) Restrict updates to URLs under this domain
+#   --domain            (Optional) Restrict updates to targets on these hosts;
+#                       repeat or comma-separate hosts, `*.brand.com` globs or
+#                       `https://...` URL prefixes
+#   --domain-file       (Optional) File with one --domain entry per line
 #   --pretty            (Default) Align columns for readability
 #   --no-pretty         Disable column alignment
+#   --csv-engine        `csv` (default) streaming csv-module loader, or `pandas`
+#                       (requires pandas)
+#   --cache-dir         Where compiled URL maps are cached, keyed by CSV size,
+#                       mtime and content hash
+#   --no-cache          Disable the URL-map cache
+#   --diff-engine       `linear` (default) single-pass diff, or `htmldiff` for
+#                       difflib.HtmlDiff (slow on large files)
+#   --report            `full` (default) diffs every line; `changes` lists only
+#                       the replaced rules
+#   --context           Lines of context around each rule in the `changes` report
+#   --global-csv        CSV map loaded once and shared by every folder. A folder's
+#                       own redirects.csv (now optional) overrides its entries
+#   --source-csv        CSV with header `old_path,new_path` that renames rule
+#                       sources in every folder; renames onto a path another
+#                       rule uses (earlier or later) are skipped and reported
+#   --no-folder-csv     With --global-csv, ignore per-folder redirects.csv files
+#   --normalize-urls    Match destinations to CSV URLs ignoring host case, default
+#                       ports, trailing slashes and unreserved percent-escapes
+#   --flatten-chains    Resolve chains across the CSV map(s) (A->B plus B->C
+#                       rewrites A straight to C); cycles are reported
+#   --max-chain-depth   Maximum hops followed when flattening (default: 10)
+#   --flatten-rules     Collapse chains between rules of each `_redirects` file
+#                       and print a hop-count histogram. Relative destinations
+#                       count as on-site, and so do absolute ones on the
+#                       folder's --site-origins origin
+#   --site-origins      CSV with header `folder,origin` giving each site's own
+#                       origin (https://www.site-a.com), keyed by folder name
+#   --all-targets       Also rewrite `http://` and relative destinations; relative
+#                       ones are looked up as the folder's origin + path, and
+#                       left unchanged in folders without a --site-origins entry
+#   --find-dead-rules   Report duplicate rules and rules covered by an earlier splat
+#   --prune             Remove those rules from each `_redirects_updated`
+#   --compact-splats    Replace groups of rules sharing a source and target prefix
+#                       with one splat rule (at least --compact-min rules each)
+#   --workers           Number of worker processes (default 1; 0 = one per CPU).
+#                       Output is always printed in sorted folder order.
+#   --force             Reprocess every folder, ignoring the manifest
+#   --metrics           Write a JSON report of wall time, CPU time, peak memory
+#                       (tracemalloc) and bytes read/written per phase, overall
+#                       and for every folder
+#   --profile           Directory for cProfile output: folder-<name>.prof/.txt
+#                       per folder, setup.prof, and bulk_update_redirects.prof
+#                       merging them all for the run
+#   --profile-sample    With --profile, sample stacks every N ms into
+#                       collapsed-stack .folded files for flame graphs
 #
 # Output:
 #   - _redirects_updated         (in each folder)
 #   - redirects_diff.html        (in each folder)
-#   - Error summary printed to console if issues occur
+#   - .redirects_manifest.json   (in the projects folder) input hashes, options
+#                                and tool version per folder; folders whose
+#                                inputs are unchanged are skipped next run
+#   - Error summary printed to console if issues occur; the exit status is 1
+#     when any folder failed
 #
 # Folder Structure:
 #   /projects/
@@ -46,116 +98,330 @@
 #
 # Notes:
 #   - `redirects.csv` must have a header row with `old_url,new_url`
+#   - With `--global-csv`, `redirects.csv` is optional in each folder
 #   - Only exact destination matches will be replaced
+#   - The rewrite engine lives in redirects_core.py, which must sit next to
+#     this script
 ################################################################################
 """
 
 import argparse
+import hashlib
+import io
+import json
 import os
-import pandas as pd
-from difflib import HtmlDiff
-
-def load_csv(csv_path):
-    df = pd.read_csv(csv_path)
-    df.columns = df.columns.str.strip().str.lower()
-    return dict(zip(df.iloc[:, 0].str.strip(), df.iloc[:, 1].str.strip()))
-
-def process_redirects(redirects_path, url_map, domain_filter):
-    with open(redirects_path, "r") as f:
-        lines = f.readlines()
-
-    updated_lines = []
-    replaced = 0
-    for line in lines:
-        parts = line.strip().split()
-        if len(parts) >= 2 and parts[1].startswith("https://"):
-            target_url = parts[1].strip()
-            if (not domain_filter or target_url.startswith(domain_filter)) and target_url in url_map:
-                parts[1] = url_map[target_url]
-                replaced += 1
-            updated_line = "  ".join(parts)
-        else:
-            updated_line = line.strip()
-        updated_lines.append(updated_line + "\n")
-    return lines, updated_lines, replaced
-
-def format_redirects(lines):
-    redirects = []
-    max_from = 0
-    max_to = 0
-
-    for line in lines:
-        parts = line.strip().split()
-        if len(parts) == 3 and parts[1].startswith("https://"):
-            from_url, to_url, status = parts
-            redirects.append((from_url, to_url, status))
-            max_from = max(max_from, len(from_url))
-            max_to = max(max_to, len(to_url))
-        else:
-            redirects.append(line.strip())
-
-    formatted = []
-    for item in redirects:
-        if isinstance(item, tuple):
-            from_url, to_url, status = item
-            formatted.append(f"{from_url.ljust(max_from + 2)}{to_url.ljust(max_to + 2)}{status}\n")
-        else:
-            formatted.append(item + "\n")
-    return formatted
-
-def write_diff(original, updated, diff_path):
-    html_diff = HtmlDiff(wrapcolumn=100).make_file(original, updated, fromdesc="Original", todesc="Updated")
-    with open(diff_path, "w") as f:
-        f.write(html_diff)
-
-def process_folder(folder_path, domain_filter, pretty, errors):
+import sys
+from collections import ChainMap, Counter
+from contextlib import redirect_stdout
+from itertools import repeat
+
+from redirects_core import (
+    DEFAULT_CACHE_DIR, DEFAULT_COMPACT_MIN, DEFAULT_MAX_CHAIN_DEPTH, CachedUrlMap, file_sha256,
+    FlattenedUrlMap, load_csv, load_domain_file, Metrics, metrics_phase, NormalizedUrlMap,
+    pipeline_options, print_chain_warnings, print_update_stats, profiling, update_redirects_file,
+    write_folded, write_metrics, write_profile_summary,
+)
+
+__version__ = "1.2"
+
+MANIFEST_NAME = ".redirects_manifest.json"
+
+# Shared `--global-csv` map. It is loaded once in main() before the worker
+# pool starts, so forked workers inherit it copy-on-write; other start methods
+# reload it once per worker in init_worker (a memory-mapped cache hit when
+# caching is enabled).
+global_url_map = None
+# `--source-csv` map, shared by every folder the same way.
+source_map = None
+# `--site-origins` map: folder name -> that site's origin.
+site_origins = None
+
+def init_worker(args):
+    global global_url_map, source_map, site_origins
+    if args.global_csv and global_url_map is None:
+        global_url_map = load_csv(args.global_csv, args.csv_engine, args.cache_dir, args.normalize_urls)
+    if args.source_csv and source_map is None:
+        source_map = NormalizedUrlMap(load_csv(args.source_csv, args.csv_engine, args.cache_dir, normalize=True))
+    if args.site_origins and site_origins is None:
+        site_origins = load_csv(args.site_origins, args.csv_engine, args.cache_dir)
+
+def load_manifest(manifest_path):
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != __version__:
+        return {}
+    return manifest.get("folders", {})
+
+def save_manifest(manifest_path, folders):
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": __version__, "folders": folders}, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def manifest_options(args):
+    # Everything that changes the output of a folder. Worker count, cache
+    # location and --force only change how the run is carried out.
+    options = {
+        "domain": args.domain,
+        "pretty": args.pretty,
+        "csv_engine": args.csv_engine,
+        "diff_engine": args.diff_engine,
+        "report": args.report,
+        "context": args.context,
+        "no_folder_csv": args.no_folder_csv,
+        "global_csv": file_sha256(args.global_csv).hex() if args.global_csv else None,
+        "source_csv": file_sha256(args.source_csv).hex() if args.source_csv else None,
+        "flatten_chains": args.flatten_chains,
+        "max_chain_depth": args.max_chain_depth,
+        "normalize_urls": args.normalize_urls,
+        "flatten_rules": args.flatten_rules,
+        "site_origins": file_sha256(args.site_origins).hex() if args.site_origins else None,
+        "all_targets": args.all_targets,
+        "find_dead_rules": args.find_dead_rules,
+        "prune": args.prune,
+        "compact_splats": args.compact_splats,
+        "compact_min": args.compact_min,
+    }
+    return hashlib.sha256(json.dumps(options, sort_keys=True).encode()).hexdigest()
+
+def file_fingerprint(path, previous=None):
+    # Size and mtime match: trust the recorded hash instead of re-reading.
+    st = os.stat(path)
+    if previous and previous.get("size") == st.st_size and previous.get("mtime_ns") == st.st_mtime_ns:
+        return previous
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": file_sha256(path).hex()}
+
+def process_folder(folder_path, args, errors, previous=None, metrics=None):
+    # Returns the folder's manifest entry on success (or when skipped as
+    # unchanged), False on error.
     csv_path = os.path.join(folder_path, "redirects.csv")
     redirects_path = os.path.join(folder_path, "_redirects")
     output_path = os.path.join(folder_path, "_redirects_updated")
     diff_path = os.path.join(folder_path, "redirects_diff.html")
 
     try:
-        if not os.path.isfile(csv_path):
+        use_folder_csv = os.path.isfile(csv_path) and not args.no_folder_csv
+        if global_url_map is None and not use_folder_csv and source_map is None:
             raise FileNotFoundError("Missing redirects.csv")
         if not os.path.isfile(redirects_path):
             raise FileNotFoundError("Missing _redirects")
 
-        url_map = load_csv(csv_path)
-        original_lines, updated_lines, replaced = process_redirects(redirects_path, url_map, domain_filter)
+        previous_inputs = (previous or {}).get("inputs", {})
+        with metrics_phase(metrics, "fingerprint"):
+            inputs = {"_redirects": file_fingerprint(redirects_path, previous_inputs.get("_redirects"))}
+            if use_folder_csv:
+                inputs["redirects.csv"] = file_fingerprint(csv_path, previous_inputs.get("redirects.csv"))
+        entry = {"options": args.manifest_options, "inputs": inputs}
+        if (
+            not args.force
+            and previous
+            and previous.get("options") == entry["options"]
+            and {name: fp["sha256"] for name, fp in previous_inputs.items()} == {name: fp["sha256"] for name, fp in inputs.items()}
+            and os.path.isfile(output_path)
+            and os.path.isfile(diff_path)
+        ):
+            print(f"⏭️  {folder_path}: unchanged, skipped.")
+            return entry
 
-        with open(output_path, "w") as f:
-            f.writelines(format_redirects(updated_lines) if pretty else updated_lines)
-        write_diff(original_lines, updated_lines, diff_path)
+        with metrics_phase(metrics, "load_csv") as io_counts:
+            folder_map = None
+            if use_folder_csv:
+                folder_map = load_csv(csv_path, args.csv_engine, args.cache_dir, args.normalize_urls)
+                if not isinstance(folder_map, CachedUrlMap):
+                    io_counts["bytes_read"] = os.path.getsize(csv_path)
+            if global_url_map is None:
+                # Only --source-csv given: sources are renamed, targets kept.
+                url_map = folder_map if folder_map is not None else {}
+            elif folder_map is not None:
+                # Folder entries take precedence; the global map is never copied.
+                url_map = ChainMap(folder_map, global_url_map)
+            else:
+                url_map = global_url_map
+        if args.normalize_urls:
+            # Wrapped once over the ChainMap so each target is canonicalized once.
+            url_map = NormalizedUrlMap(url_map)
+        if args.flatten_chains:
+            # Resolved lazily: only chains reached by this folder's rules are
+            # walked, so a large shared map is not re-scanned per folder.
+            url_map = FlattenedUrlMap(url_map, args.max_chain_depth)
+        # Each site's own origin: destinations on another site's origin are
+        # never followed through this site's rules. Without one, relative
+        # targets are left alone rather than matched against CSV entries that
+        # may belong to another site.
+        origin = site_origins.get(os.path.basename(folder_path)) if site_origins else None
+        options = pipeline_options(args, site_origin=origin, relative_targets=origin is not None)
+        if args.all_targets and origin is None:
+            print(f"⚠️  {folder_path}: no --site-origins entry, relative destinations left unchanged")
+        stats = update_redirects_file(redirects_path, output_path, diff_path, url_map, options, metrics, source_map)
 
-        print(f"✅ {folder_path}: {replaced} replacements made.")
+        if args.flatten_chains:
+            print_chain_warnings(url_map, f"{folder_path}: ")
+        print_update_stats(stats, f"{folder_path}: ", args.prune)
+        print(f"✅ {folder_path}: {stats.replaced} replacements made.")
         print(f"📝 Updated file saved to {output_path}")
         print(f"📊 Diff file saved to {diff_path}")
         print("")
-        return True
+        return entry
     except Exception as e:
         error_msg = f"❌ {folder_path}: {str(e)}"
         print(error_msg)
         errors.append(error_msg)
         return False
 
+def process_folder_captured(folder_path, args, previous=None):
+    # Pool workers buffer their console output so main can print it in folder
+    # order, whatever order the workers finish in.
+    errors = []
+    buffer = io.StringIO()
+    metrics = Metrics() if args.metrics else None
+    with redirect_stdout(buffer), profiling(args.profile, folder_profile_name(folder_path), args.profile_sample):
+        entry = process_folder(folder_path, args, errors, previous, metrics)
+    return buffer.getvalue(), errors, entry, folder_metrics_report(metrics, entry)
+
+def folder_profile_name(folder_path):
+    return "folder-" + os.path.basename(folder_path)
+
+def merge_profiles(profile_dir, names):
+    # One run-level profile: every folder's pstats and sampled stacks summed.
+    prefix = os.path.join(profile_dir, "bulk_update_redirects")
+    paths = [os.path.join(profile_dir, name + ".prof") for name in names]
+    paths = [path for path in paths if os.path.isfile(path)]
+    if not paths:
+        return None
+    import pstats
+
+    stats = pstats.Stats(*paths)
+    stats.dump_stats(prefix + ".prof")
+    write_profile_summary(prefix + ".txt", stats)
+
+    samples = Counter()
+    for name in names:
+        folded_path = os.path.join(profile_dir, name + ".folded")
+        if os.path.isfile(folded_path):
+            with open(folded_path) as f:
+                for line in f:
+                    stack, _, count = line.rstrip("\n").rpartition(" ")
+                    samples[stack] += int(count)
+    if samples:
+        write_folded(prefix + ".folded", samples)
+    return prefix + ".prof"
+
+def folder_metrics_report(metrics, entry):
+    if metrics is None:
+        return None
+    return metrics.report(ok=bool(entry), skipped=bool(entry) and "load_csv" not in metrics.phases)
+
 def main():
     parser = argparse.ArgumentParser(description="Bulk update Netlify _redirects files in folder structure.")
     parser.add_argument("--projects-folder", required=True, help="Top-level folder containing project subfolders")
-    parser.add_argument("--domain", default="", help="Only replace URLs starting with this domain (optional)")
+    parser.add_argument("--domain", action="append", default=[], help="Only replace URLs on these hosts: repeat or comma-separate; `*.brand.com` globs and https:// prefixes work too (optional)")
+    parser.add_argument("--domain-file", help="File with one --domain entry per line")
     parser.add_argument("--pretty", action="store_true", default=True, help="Enable column-aligned output formatting")
     parser.add_argument("--no-pretty", dest="pretty", action="store_false", help="Disable column-aligned output formatting")
+    parser.add_argument("--csv-engine", choices=["csv", "pandas"], default="csv", help="CSV loader: streaming csv module (default) or pandas (must be installed)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help=f"Directory for compiled URL-map caches (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--no-cache", dest="cache_dir", action="store_const", const=None, help="Always re-parse the CSVs")
+    parser.add_argument("--diff-engine", choices=["linear", "htmldiff"], default="linear", help="Diff generator: fast line-paired table (default) or difflib.HtmlDiff")
+    parser.add_argument("--report", choices=["full", "changes"], default="full", help="Write a full-file diff (default) or only the replaced rules")
+    parser.add_argument("--context", type=int, default=0, help="Context lines around each replaced rule in the changes report (default: 0)")
+    parser.add_argument("--global-csv", help="CSV map shared by every folder; per-folder redirects.csv files are overlaid on top")
+    parser.add_argument("--source-csv", help="CSV with header old_path,new_path for renaming rule sources in every folder")
+    parser.add_argument("--no-folder-csv", action="store_true", help="With --global-csv, ignore per-folder redirects.csv files")
+    parser.add_argument("--normalize-urls", action="store_true", help="Match targets to CSV URLs regardless of host case, default port, trailing slash and percent-encoding")
+    parser.add_argument("--flatten-chains", action="store_true", help="Follow A->B->C chains in the CSV maps so targets point straight at the final URL")
+    parser.add_argument("--max-chain-depth", type=int, default=DEFAULT_MAX_CHAIN_DEPTH, help=f"Maximum hops followed by --flatten-chains (default: {DEFAULT_MAX_CHAIN_DEPTH})")
+    parser.add_argument("--flatten-rules", action="store_true", help="Collapse chains of _redirects rules in each site so each points at its final destination")
+    parser.add_argument("--site-origins", help="CSV with header folder,origin mapping each folder to its site's origin, e.g. site-a,https://www.site-a.com")
+    parser.add_argument("--all-targets", action="store_true", help="Also rewrite http:// and relative destinations (relative ones are looked up on the folder's origin)")
+    parser.add_argument("--find-dead-rules", action="store_true", help="Report rules that never fire because an earlier rule matches first")
+    parser.add_argument("--prune", action="store_true", help="Remove rules that never fire from each updated file (implies --find-dead-rules)")
+    parser.add_argument("--compact-splats", action="store_true", help="Replace groups of rules that share a source and target prefix with one splat rule")
+    parser.add_argument("--compact-min", type=int, default=DEFAULT_COMPACT_MIN, help=f"Smallest group --compact-splats replaces (default: {DEFAULT_COMPACT_MIN})")
+    parser.add_argument("--workers", type=int, default=1, help="Process folders in parallel with N worker processes (0 = one per CPU)")
+    parser.add_argument("--force", action="store_true", help="Reprocess every folder even if its inputs are unchanged")
+    parser.add_argument("--metrics", help="Write per-phase timing and memory metrics (overall and per folder) to this JSON file")
+    parser.add_argument("--profile", metavar="DIR", help="Write cProfile/pstats output per folder, plus a merged run profile, to this directory")
+    parser.add_argument("--profile-sample", metavar="MS", type=float, help="With --profile, also sample stacks every MS milliseconds into collapsed-stack .folded files")
     args = parser.parse_args()
+    if args.context < 0:
+        parser.error("--context must be 0 or more")
+    if args.domain_file:
+        args.domain += load_domain_file(args.domain_file)
 
-    errors = []
+    metrics = Metrics() if args.metrics else None
+
+    folders = []
     for name in sorted(os.listdir(args.projects_folder)):
         subfolder = os.path.join(args.projects_folder, name)
         if os.path.isdir(subfolder):
-            process_folder(subfolder, args.domain, args.pretty, errors)
+            folders.append(subfolder)
+
+    with profiling(args.profile, "setup", args.profile_sample):
+        with metrics_phase(metrics, "load_global_csv"):
+            init_worker(args)
+        if args.flatten_chains and global_url_map is not None:
+            # Report cycles in the shared map once rather than per folder.
+            shared_map = NormalizedUrlMap(global_url_map) if args.normalize_urls else global_url_map
+            print_chain_warnings(FlattenedUrlMap(shared_map, args.max_chain_depth).resolve_all(), "global CSV: ")
+        with metrics_phase(metrics, "manifest"):
+            args.manifest_options = manifest_options(args)
+            manifest_path = os.path.join(args.projects_folder, MANIFEST_NAME)
+            manifest = load_manifest(manifest_path)
+            previous = [manifest.get(os.path.basename(folder)) for folder in folders]
+
+    errors = []
+    entries = []
+    folder_metrics = []
+    workers = args.workers if args.workers > 0 else os.cpu_count()
+    if workers > 1 and len(folders) > 1:
+        # The pool machinery is only imported when a pool is actually used.
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        mp_context = None
+        if "fork" in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=init_worker, initargs=(args,)) as executor:
+            # map() yields results in submission order, keeping output sorted.
+            for output, folder_errors, entry, report in executor.map(process_folder_captured, folders, repeat(args), previous):
+                sys.stdout.write(output)
+                errors.extend(folder_errors)
+                entries.append(entry)
+                folder_metrics.append(report)
+    else:
+        for subfolder, folder_previous in zip(folders, previous):
+            folder_metric = Metrics() if metrics is not None else None
+            with profiling(args.profile, folder_profile_name(subfolder), args.profile_sample):
+                entry = process_folder(subfolder, args, errors, folder_previous, folder_metric)
+            entries.append(entry)
+            folder_metrics.append(folder_metrics_report(folder_metric, entry))
+
+    # Failed folders are left out so they are retried on the next run.
+    save_manifest(manifest_path, {
+        os.path.basename(folder): entry for folder, entry in zip(folders, entries) if entry
+    })
+
+    if metrics is not None:
+        write_metrics(args.metrics, metrics.report(
+            tool="bulk_update_redirects",
+            version=__version__,
+            workers=workers,
+            folders={os.path.basename(folder): report for folder, report in zip(folders, folder_metrics)},
+        ))
+        print(f"⏱️  Metrics saved to {args.metrics}")
+
+    if args.profile:
+        run_profile = merge_profiles(args.profile, ["setup"] + [folder_profile_name(folder) for folder in folders])
+        print(f"🔬 Profiles saved to {args.profile} (run total: {run_profile})")
 
     if errors:
         print("\n--- Error Summary ---")
         for err in errors:
             print(err)
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
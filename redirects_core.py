@@ -0,0 +1,1565 @@
+"""
+################################################################################
+# Module Name: redirects_core.py
+#
+# Description:
+#   The rewrite engine shared by update_netlify_redirects.py and
+#   bulk_update_redirects.py: CSV loading and the compiled URL-map cache, URL
+#   normalization and chain flattening, the streaming rule pipeline (target
+#   and source rewrites, rule-chain flattening, dead-rule detection, splat
+#   compaction), the diff and changes-report writers, metrics and profiling.
+#
+#   It can also be embedded without going through files:
+#     - rewrite_redirects() takes any iterable of `_redirects` lines and
+#       yields one rule record per line, with its change event (CHANGE,
+#       RENAMED, DROPPED) attached
+#     - update_redirects() yields (output text, rule) pairs, formatted as the
+#       CLIs write them
+#     - pipeline_options() fills in the CLI defaults for the settings not
+#       given (as a mapping or keywords); unknown names raise TypeError
+#     - DiffWriter and ReportWriter accept an open file object (io.StringIO)
+#       in place of a path
+#
+# Usage:
+#   from redirects_core import UpdateStats, pipeline_options, update_redirects
+#
+#   stats = UpdateStats()
+#   url_map = {"https://old.example.com/a": "https://new.example.com/a"}
+#   options = pipeline_options(pretty=False, domain=["old.example.com"])
+#   pairs = update_redirects(lines, url_map, options, stats=stats)
+#   updated = "".join(text for text, rule in pairs)
+################################################################################
+"""
+
+import hashlib
+import mmap
+import os
+import re
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from array import array
+from collections import Counter, deque
+from collections.abc import Mapping
+from contextlib import contextmanager, nullcontext
+from html import escape
+from itertools import zip_longest
+from types import SimpleNamespace
+
+def load_csv(csv_path, engine="csv", cache_dir=None, normalize=False):
+    # With `normalize`, old URLs are stored in canonical_url form; look them up
+    # through NormalizedUrlMap.
+    if cache_dir:
+        return load_csv_cached(csv_path, engine, cache_dir, normalize)
+    if engine == "pandas":
+        url_map = load_csv_pandas(csv_path)
+        if normalize:
+            url_map = {canonical_url(key): value for key, value in url_map.items() if isinstance(key, str)}
+        return url_map
+
+    # Imported here so runs served from the URL-map cache never load it.
+    import csv
+
+    # Rows stream straight into the dict; nothing else is kept in memory.
+    url_map = {}
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header row: old_url,new_url
+        if normalize:
+            for row in reader:
+                if len(row) >= 2:
+                    url_map[canonical_url(row[0].strip())] = row[1].strip()
+        else:
+            for row in reader:
+                if len(row) >= 2:
+                    url_map[row[0].strip()] = row[1].strip()
+    return url_map
+
+def load_csv_pandas(csv_path):
+    # Optional engine: pandas is only imported when explicitly requested.
+    import pandas as pd
+
+    df = pd.read_csv(csv_path)
+    df.columns = df.columns.str.strip().str.lower()
+    return dict(zip(df.iloc[:, 0].str.strip(), df.iloc[:, 1].str.strip()))
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "netlify-redirect-updater",
+)
+
+# Cache file layout: header (magic, CSV size, CSV mtime in ns, CSV sha256, slot
+# count, entry count), an open-addressing table of entry offsets, then the
+# entries themselves (key length, value length, UTF-8 key, UTF-8 value). The
+# file is memory-mapped and probed in place, so a cache hit costs one mmap no
+# matter how large the map is. Native byte order: caches are machine-local.
+# The version byte is bumped whenever the stored keys change form (layout or
+# canonical_url), so older caches are rebuilt rather than misread.
+CACHE_MAGIC = b"NRUMAP" + bytes([3, sys.byteorder == "little"])
+CACHE_HEADER = struct.Struct(f"={len(CACHE_MAGIC)}sQq32sQQ")
+CACHE_ENTRY = struct.Struct("=II")
+
+class CachedUrlMap(Mapping):
+    """Read-only url_map backed by a memory-mapped cache file."""
+
+    def __init__(self, cache_path):
+        with open(cache_path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mm) < CACHE_HEADER.size:
+            raise ValueError(f"Truncated URL-map cache: {cache_path}")
+        magic, self.csv_size, self.csv_mtime_ns, self.csv_digest, nslots, self._count = CACHE_HEADER.unpack_from(self._mm)
+        if magic != CACHE_MAGIC:
+            raise ValueError(f"Unsupported URL-map cache: {cache_path}")
+        self._mask = nslots - 1
+        self._entries = CACHE_HEADER.size + 8 * nslots
+        self._slots = memoryview(self._mm)[CACHE_HEADER.size:self._entries].cast("Q")
+
+    def get(self, key, default=None):
+        if not isinstance(key, str):
+            return default
+        key_bytes = key.encode("utf-8")
+        mm = self._mm
+        i = zlib.crc32(key_bytes) & self._mask
+        while True:
+            offset = self._slots[i]
+            if not offset:
+                return default
+            pos = self._entries + offset - 1
+            key_len, value_len = CACHE_ENTRY.unpack_from(mm, pos)
+            pos += CACHE_ENTRY.size
+            if key_len == len(key_bytes) and mm[pos:pos + key_len] == key_bytes:
+                return mm[pos + key_len:pos + key_len + value_len].decode("utf-8")
+            i = (i + 1) & self._mask
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __iter__(self):
+        mm = self._mm
+        pos = self._entries
+        for _ in range(self._count):
+            key_len, value_len = CACHE_ENTRY.unpack_from(mm, pos)
+            pos += CACHE_ENTRY.size
+            yield mm[pos:pos + key_len].decode("utf-8")
+            pos += key_len + value_len
+
+    def __len__(self):
+        return self._count
+
+_MISSING = object()
+
+def load_csv_cached(csv_path, engine, cache_dir, normalize=False):
+    csv_path = os.path.abspath(csv_path)
+    st = os.stat(csv_path)
+    cache_key = f"{csv_path}|{engine}|normalized" if normalize else f"{csv_path}|{engine}"
+    cache_name = hashlib.sha256(cache_key.encode()).hexdigest()[:32] + ".urlmap"
+    cache_path = os.path.join(cache_dir, cache_name)
+
+    try:
+        cached = CachedUrlMap(cache_path)
+    except (OSError, ValueError):
+        cached = None
+
+    digest = None
+    if cached is not None and cached.csv_size == st.st_size:
+        if cached.csv_mtime_ns == st.st_mtime_ns:
+            return cached
+        # Touched but possibly unchanged: confirm with the content hash and
+        # refresh the recorded mtime so the next run takes the fast path.
+        digest = file_sha256(csv_path)
+        if digest == cached.csv_digest:
+            refresh_url_map_cache(cache_path, cached, st)
+            return cached
+
+    url_map = load_csv(csv_path, engine, normalize=normalize)
+    write_url_map_cache(cache_path, st, digest or file_sha256(csv_path), url_map)
+    return url_map
+
+def file_sha256(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.digest()
+
+def refresh_url_map_cache(cache_path, cached, st):
+    # Only the header changes; the open mapping keeps serving lookups.
+    try:
+        with open(cache_path, "r+b") as f:
+            f.write(CACHE_HEADER.pack(CACHE_MAGIC, st.st_size, st.st_mtime_ns, cached.csv_digest, cached._mask + 1, len(cached)))
+    except OSError:
+        pass
+
+def write_url_map_cache(cache_path, st, digest, url_map):
+    nslots = 8
+    while nslots < 2 * len(url_map):
+        nslots <<= 1
+    mask = nslots - 1
+    slots = array("Q", bytes(8 * nslots))
+    entries = bytearray()
+    count = 0
+    for key, value in url_map.items():
+        # The pandas engine yields NaN for empty cells; those never match a URL.
+        if not isinstance(key, str) or not isinstance(value, str):
+            continue
+        key_bytes = key.encode("utf-8")
+        value_bytes = value.encode("utf-8")
+        i = zlib.crc32(key_bytes) & mask
+        while slots[i]:
+            i = (i + 1) & mask
+        slots[i] = len(entries) + 1
+        entries += CACHE_ENTRY.pack(len(key_bytes), len(value_bytes))
+        entries += key_bytes
+        entries += value_bytes
+        count += 1
+
+    import tempfile
+
+    # Best effort: an unwritable cache directory only costs the speed-up.
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(CACHE_HEADER.pack(CACHE_MAGIC, st.st_size, st.st_mtime_ns, digest, nslots, count))
+            f.write(slots.tobytes())
+            f.write(entries)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+
+UNRESERVED_CHARS = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+PERCENT_ESCAPE = re.compile(r"%([0-9A-Fa-f]{2})")
+DEFAULT_PORTS = {"http": ":80", "https": ":443"}
+
+def normalize_escape(match):
+    char = chr(int(match.group(1), 16))
+    return char if char in UNRESERVED_CHARS else "%" + match.group(1).upper()
+
+def canonical_url(url):
+    # --normalize-urls form: scheme and host lower-cased, default port dropped,
+    # trailing slashes dropped from the path, escapes of unreserved characters
+    # decoded and all other escapes upper-cased. Query and fragment are kept
+    # as they are.
+    if "%" in url:
+        url = PERCENT_ESCAPE.sub(normalize_escape, url)
+    scheme, sep, rest = url.partition("://")
+    if sep:
+        # The authority ends at the path, or at the query or fragment of a
+        # URL without one.
+        end = len(rest)
+        for char in "/?#":
+            i = rest.find(char, 0, end)
+            if i != -1:
+                end = i
+        origin = scheme.lower() + "://" + rest[:end].lower()
+        port = DEFAULT_PORTS.get(origin[:len(scheme)])
+        if port and origin.endswith(port):
+            origin = origin[:-len(port)]
+        path = rest[end:]
+    else:
+        origin = ""
+        path = url
+    if "?" in path or "#" in path:
+        cut = min(i for i in (path.find("?"), path.find("#")) if i != -1)
+        return origin + path[:cut].rstrip("/") + path[cut:]
+    return origin + path.rstrip("/")
+
+class NormalizedUrlMap(Mapping):
+    """url_map view for a map loaded with `normalize`: keys are looked up in
+    canonical_url form, so one CSV row answers for every equivalent spelling."""
+
+    def __init__(self, url_map):
+        self.url_map = url_map
+
+    def get(self, key, default=None):
+        return self.url_map.get(canonical_url(key), default)
+
+    def __getitem__(self, key):
+        return self.url_map[canonical_url(key)]
+
+    def __contains__(self, key):
+        return canonical_url(key) in self.url_map
+
+    def __iter__(self):
+        return iter(self.url_map)
+
+    def __len__(self):
+        return len(self.url_map)
+
+DEFAULT_MAX_CHAIN_DEPTH = 10
+
+class FlattenedUrlMap(Mapping):
+    """url_map view that follows A -> B -> C chains to the final URL.
+
+    Each lookup walks the chain through the underlying map once and memoizes
+    the result, with its hop count, for every URL on the walk, so the total
+    cost is bounded by the number of distinct URLs visited. URLs on or
+    leading into a cycle keep their direct target and the cycle is recorded
+    in `cycles`; chains longer than `max_depth` hops stop there and their
+    start is recorded in `truncated`. Only the start of a truncated chain is
+    memoized, so every URL resolves the same way whatever order the lookups
+    come in.
+    """
+
+    def __init__(self, url_map, max_depth=DEFAULT_MAX_CHAIN_DEPTH):
+        self.url_map = url_map
+        self.max_depth = max_depth
+        self.cycles = []
+        self.truncated = []
+        # URL -> (resolved URL, hops to it, or None on a cycle)
+        self._memo = {}
+
+    def get(self, key, default=None):
+        memo = self._memo
+        if key in memo:
+            return memo[key][0]
+        base_get = self.url_map.get
+        target = base_get(key)
+        if target is None:
+            return default
+
+        path = [key]
+        on_path = {key}
+        while True:
+            resolved = memo.get(target)
+            if resolved is not None:
+                final, hops = resolved
+                if hops is None or len(path) + hops <= self.max_depth:
+                    break
+            next_target = base_get(target)
+            if next_target is None:
+                final, hops = target, 0
+                break
+            if target in on_path:
+                self.cycles.append(path[path.index(target):] + [target])
+                hops = None
+                break
+            if len(path) >= self.max_depth:
+                self.truncated.append(key)
+                memo[key] = (target, len(path))
+                return target
+            path.append(target)
+            on_path.add(target)
+            target = next_target
+
+        steps = len(path)
+        for i, url in enumerate(path):
+            memo[url] = (base_get(url), None) if hops is None else (final, steps - i + hops)
+        return memo[key][0]
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return key in self.url_map
+
+    def __iter__(self):
+        return iter(self.url_map)
+
+    def __len__(self):
+        return len(self.url_map)
+
+    def resolve_all(self):
+        # Computes the full transitive closure up front, which also surfaces
+        # cycles among entries no rule points at.
+        for key in self.url_map:
+            self.get(key)
+        return self
+
+def print_chain_warnings(flattened, label=""):
+    for cycle in flattened.cycles:
+        print(f"⚠️  {label}Redirect cycle in CSV map: {' → '.join(cycle)}")
+    for start in flattened.truncated:
+        print(f"⚠️  {label}Chain from {start} exceeds {flattened.max_depth} hops; flattened only that far")
+
+# Parsed rule records are plain lists indexed by these constants; a list
+# literal is several times cheaper to build than a class instance, and one is
+# built for every line of the file.
+#   LINENO  1-based line number
+#   LINE    original line as read
+#   PARTS   whitespace-separated fields of a destination rule (`from to
+#           [status ...]` with an `https://` target), or None for every other
+#           line (comments, blanks, unsupported targets); those pass through
+#           as `LINE.strip()`
+#   CHANGE  (line number, from path, old target, new target, status) once
+#           rewrite_rules replaces the target, else None
+#   DROPPED why the rule was removed from the output (--prune), else None
+#   RENAMED original from path once rewrite_sources renames it, else None
+LINENO, LINE, PARTS, CHANGE, DROPPED, RENAMED = range(6)
+
+def rule_text(rule):
+    parts = rule[PARTS]
+    if parts is None:
+        return rule[LINE].strip()
+    return "  ".join(parts)
+
+def parse_rules(lines):
+    # Each line is split exactly once; rewrite and format reuse the fields.
+    for lineno, line in enumerate(lines, 1):
+        parts = line.split()
+        if len(parts) >= 2 and parts[1].startswith("https://"):
+            yield [lineno, line, parts, None, None, None]
+        else:
+            yield [lineno, line, None, None, None, None]
+
+class DomainFilter:
+    """Decides whether a target URL is on one of the `--domain` hosts.
+
+    Entries are host names (`www.example.com`), subdomain globs
+    (`*.brand.com`, which does not match `brand.com` itself), other fnmatch
+    globs, or URL prefixes containing `://` (the original `--domain` form,
+    matched with startswith). Each target's host is sliced out once and looked
+    up in a set, then in a set of glob suffixes one label at a time; results
+    are cached per host, so thousands of domains cost the same per rule as one.
+    """
+
+    def __init__(self, domains):
+        self.hosts = set()
+        self.suffixes = set()
+        self.patterns = []
+        prefixes = []
+        for entry in domains:
+            for domain in entry.split(","):
+                domain = domain.strip()
+                if not domain:
+                    continue
+                if "://" in domain:
+                    prefixes.append(domain)
+                    continue
+                domain = domain.lower().rstrip(".")
+                if domain.startswith("*.") and not any(c in domain[2:] for c in "*?["):
+                    self.suffixes.add(domain[1:])
+                elif any(c in domain for c in "*?["):
+                    self.patterns.append(domain)
+                else:
+                    self.hosts.add(domain)
+        self.prefixes = tuple(prefixes)
+        self.cache = {}
+
+    def __bool__(self):
+        return bool(self.hosts or self.suffixes or self.patterns or self.prefixes)
+
+    def matches(self, url):
+        if self.prefixes and url.startswith(self.prefixes):
+            return True
+        host = url.partition("://")[2].partition("/")[0]
+        hit = self.cache.get(host)
+        if hit is None:
+            hit = self.cache[host] = self.match_host(host)
+        return hit
+
+    def match_host(self, host):
+        host = host.partition("?")[0].partition("#")[0].rpartition("@")[2].partition(":")[0].lower().rstrip(".")
+        if not host:
+            return False
+        if host in self.hosts:
+            return True
+        if self.suffixes:
+            dot = host.find(".")
+            while dot != -1:
+                if host[dot:] in self.suffixes:
+                    return True
+                dot = host.find(".", dot + 1)
+        if not self.patterns:
+            return False
+        from fnmatch import fnmatchcase
+
+        return any(fnmatchcase(host, pattern) for pattern in self.patterns)
+
+def compile_domain_filter(domains):
+    # `--domain` values (a string or a list of them) -> DomainFilter, or None
+    # when no domain was given.
+    if isinstance(domains, DomainFilter):
+        return domains or None
+    if not domains:
+        return None
+    if isinstance(domains, str):
+        domains = [domains]
+    return DomainFilter(domains) or None
+
+def load_domain_file(path):
+    # One `--domain` entry per line; blank lines and # comments are skipped.
+    with open(path, "r") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+def rewrite_rules(rules, url_map, domain_filter, all_targets=False, site_origin=None, relative_targets=True):
+    get = url_map.get
+    domain_filter = compile_domain_filter(domain_filter)
+    matches = domain_filter.matches if domain_filter is not None else None
+    for rule in rules:
+        parts = rule[PARTS]
+        if parts is not None:
+            target_url = parts[1]
+            if matches is None or matches(target_url):
+                new_url = get(target_url)
+                if new_url is not None:
+                    parts[1] = new_url
+                    rule[CHANGE] = (rule[LINENO], parts[0], target_url, new_url, parts[2] if len(parts) > 2 else "")
+        elif all_targets:
+            rewrite_other_target(rule, get, matches, site_origin, relative_targets)
+        yield rule
+
+def rewrite_other_target(rule, get, matches, site_origin, relative_targets=True):
+    # --all-targets: http:// and relative destinations, which parse_rules
+    # leaves unsplit. A relative target is looked up as `site_origin + path`
+    # (as-is without an origin, unless `relative_targets` is off) and stays
+    # relative when its new URL is on the same origin. Lines that do not
+    # change keep their original text.
+    parts = rule_fields(rule)
+    if parts is None:
+        return
+    target_url = parts[1]
+    if target_url.startswith("http://"):
+        lookup_url = target_url
+    elif target_url.startswith("/") and site_origin:
+        lookup_url = site_origin + target_url
+    elif target_url.startswith("/") and relative_targets:
+        lookup_url = target_url
+    else:
+        return
+    if matches is not None and not matches(lookup_url):
+        return
+    new_url = get(lookup_url)
+    if new_url is None:
+        return
+    if site_origin and target_url.startswith("/") and (new_url == site_origin or new_url.startswith(site_origin + "/")):
+        new_url = new_url[len(site_origin):] or "/"
+    parts[1] = new_url
+    rule[PARTS] = parts
+    rule[CHANGE] = (rule[LINENO], parts[0], target_url, new_url, parts[2] if len(parts) > 2 else "")
+
+def index_sources(rules, source_map):
+    # Decides which renames rewrite_sources applies: line number -> [new
+    # path, line of the rule already using it or None]. A rename is rejected
+    # when its new path is the source of a rule that keeps its path, or of an
+    # earlier accepted rename. A rejected rule keeps its own path in turn, so
+    # the renames onto that path are checked again until nothing changes.
+    get = source_map.get
+    kept = {}
+    renames = {}
+    by_target = {}
+    for rule in rules:
+        parts = rule_fields(rule)
+        if parts is None:
+            continue
+        source = parts[0]
+        key = site_path(source, None) or source
+        new_source = get(source)
+        if new_source is None or new_source == source:
+            kept.setdefault(key, rule[LINENO])
+            continue
+        renames[rule[LINENO]] = [new_source, None]
+        target = site_path(new_source, None) or new_source
+        if target == key:
+            # Only the spelling changes (a trailing slash); the rule keeps
+            # its path as far as matching goes.
+            kept.setdefault(key, rule[LINENO])
+        else:
+            by_target.setdefault(target, []).append((rule[LINENO], key))
+
+    pending = list(by_target)
+    while pending:
+        target = pending.pop()
+        holder = kept.get(target)
+        for lineno, key in by_target[target]:
+            if holder is None:
+                holder = lineno
+            else:
+                renames[lineno][1] = holder
+                if key not in kept:
+                    kept[key] = lineno
+                    if key in by_target:
+                        pending.append(key)
+    return renames
+
+def rewrite_sources(rules, renames, stats):
+    # --source-csv: renames from paths as planned by index_sources (the
+    # source map is loaded with `normalize` and wrapped in NormalizedUrlMap,
+    # so trailing slashes and percent-encoding do not matter). Renames onto a
+    # path another rule keeps are skipped and land in `stats.source_conflicts`.
+    for rule in rules:
+        plan = renames.get(rule[LINENO])
+        if plan is None:
+            yield rule
+            continue
+        parts = rule_fields(rule)
+        new_source, holder = plan
+        if holder is not None:
+            stats.source_conflicts.append((rule[LINENO], parts[0], new_source, holder))
+        else:
+            rule[RENAMED] = parts[0]
+            parts[0] = new_source
+            rule[PARTS] = parts
+            stats.sources_renamed += 1
+        yield rule
+
+# Only permanent redirects are followed or flattened: folding a temporary hop
+# into a permanent one would make browsers cache a destination that may move.
+PERMANENT_STATUSES = {"301", "308"}
+
+def rule_status(parts):
+    # Netlify defaults to 301; a trailing "!" only forces the rule.
+    return parts[2].rstrip("!") if len(parts) > 2 else "301"
+
+def rule_fields(rule):
+    # Fields of any rule line, including the relative-target ones that
+    # parse_rules leaves unsplit; None for comments and blank lines.
+    parts = rule[PARTS]
+    if parts is None:
+        parts = rule[LINE].split()
+        if len(parts) < 2 or parts[0].startswith("#"):
+            return None
+    return parts
+
+def site_path(url, origin):
+    # Path of `url` if it is served by this site (relative, or absolute on
+    # `origin`), with any trailing slash dropped as Netlify ignores it when
+    # matching. URLs with a query or fragment are not followed.
+    if origin and url.startswith(origin):
+        url = url[len(origin):] or "/"
+    if not url.startswith("/") or "?" in url or "#" in url:
+        return None
+    if len(url) > 1 and url.endswith("/"):
+        url = url[:-1]
+    return url
+
+def is_chain_hop(parts):
+    # A rule a visitor can be bounced through: plain source path (no splat or
+    # placeholder), a permanent redirect and no conditions such as Country=.
+    source = parts[0]
+    if "*" in source or "/:" in source or len(parts) > 3:
+        return False
+    return rule_status(parts) in PERMANENT_STATUSES
+
+def covering_splats(path, splats):
+    # Values of `splats` (splat prefix ending in "/" -> value) whose prefix
+    # covers `path`, shortest prefix first.
+    slash = path.find("/")
+    while slash != -1:
+        earlier = splats.get(path[:slash + 1])
+        if earlier is not None:
+            yield earlier
+        slash = path.find("/", slash + 1)
+
+def source_pattern(source):
+    # Regex for a placeholder or wildcard source (`/:lang/c`, `/blog/:year/*`):
+    # a placeholder matches one path segment, a `*` anything.
+    splat = source.endswith("/*")
+    body = source[:-2] if splat else source.rstrip("/")
+    pattern = "/".join(
+        "[^/]+" if segment.startswith(":") else re.escape(segment).replace(r"\*", ".*")
+        for segment in body.split("/")
+    )
+    return re.compile(pattern + ("(?:/.*)?" if splat else "") + "$")
+
+def build_rule_index(rules, origin):
+    # Source path -> target of the first rule for that path (Netlify stops at
+    # the first match). A path whose first rule is not a plain redirect, or
+    # that an earlier splat, placeholder or wildcard rule could answer, maps to
+    # None so chains are never followed through it.
+    index = {}
+    splats = {}
+    patterns = []
+    for rule in rules:
+        parts = rule_fields(rule)
+        if parts is None or not parts[0].startswith("/"):
+            continue
+        source = parts[0]
+        if "/:" in source or "*" in source:
+            if source.endswith("/*") and "/:" not in source and "*" not in source[:-1]:
+                splats.setdefault(source[:-1], True)
+            else:
+                patterns.append(source_pattern(source))
+            continue
+        path = site_path(source, None)
+        if path is None or path in index:
+            continue
+        # `/x/*` is taken to answer `/x` as well; stopping a chain early only
+        # leaves a hop in place.
+        if any(covering_splats(path if path.endswith("/") else path + "/", splats)) or any(
+            pattern.match(path) for pattern in patterns
+        ):
+            index[path] = None
+        else:
+            index[path] = parts[1] if is_chain_hop(parts) else None
+    return index
+
+def flatten_rule_chains(rules, index, origin, max_depth, stats):
+    # Points each permanent redirect to an on-site destination straight at the
+    # end of its chain of rules and records the hop-count histogram in
+    # `stats`. Chains that loop are left as they are.
+    for rule in rules:
+        parts = rule_fields(rule)
+        path = None
+        if parts is not None and rule_status(parts) in PERMANENT_STATUSES:
+            path = site_path(parts[1], origin)
+        if path is None:
+            yield rule
+            continue
+
+        seen = {site_path(parts[0], None), path}
+        chain = [parts[1]]
+        target = parts[1]
+        hops = 0
+        cycle = False
+        while hops < max_depth:
+            next_target = index.get(path)
+            if next_target is None:
+                break
+            hops += 1
+            target = next_target
+            chain.append(target)
+            path = site_path(target, origin)
+            if path is None:
+                break
+            if path in seen:
+                cycle = True
+                break
+            seen.add(path)
+
+        if cycle:
+            stats.chain_cycles.append((rule[LINENO], [parts[0]] + chain))
+        else:
+            stats.chain_hops[hops] += 1
+            if hops:
+                old_url = rule[CHANGE][2] if rule[CHANGE] else parts[1]
+                parts[1] = target
+                rule[PARTS] = parts
+                rule[CHANGE] = (rule[LINENO], parts[0], old_url, target, parts[2] if len(parts) > 2 else "")
+                stats.chains_flattened += 1
+        yield rule
+
+def find_dead_rules(rules, prune, stats):
+    # Netlify stops at the first matching rule, so a rule is dead when an
+    # earlier one matches every request it would: one with the same source
+    # path, or a splat whose prefix covers it. A rule without "!" is skipped
+    # when a file exists at the path, so it only hides later unforced rules.
+    # Conditional rules (query parameters, Country= etc.) never hide anything;
+    # placeholder and absolute sources are not analysed. Dead rules go to
+    # `stats.dead_rules` and, when pruning, are marked DROPPED.
+    exact = {}
+    splats = {}
+    for rule in rules:
+        parts = rule_fields(rule)
+        source = parts[0] if parts is not None else ""
+        splat = source.endswith("/*")
+        if not source.startswith("/") or "/:" in source or "*" in (source[:-1] if splat else source):
+            yield rule
+            continue
+        path = source[:-1] if splat else site_path(source, None)
+        forced = len(parts) > 2 and parts[2].endswith("!")
+
+        earlier = exact.get(path) if not splat else None
+        reason = None
+        if earlier is not None and (earlier[1] or not forced):
+            reason = f"same source as line {earlier[0]}"
+        elif splats:
+            for earlier in covering_splats(path, splats):
+                if earlier[1] or not forced:
+                    reason = f"covered by {earlier[2]} on line {earlier[0]}"
+                    break
+
+        if reason is not None:
+            stats.dead_rules.append((rule[LINENO], rule[LINE].strip(), reason))
+            if prune:
+                rule[PARTS] = parts
+                rule[CHANGE] = None
+                rule[DROPPED] = reason
+        elif len(parts) <= 3 and (parts[1].startswith("/") or "://" in parts[1]):
+            index = splats if splat else exact
+            earlier = index.get(path)
+            if earlier is None or (forced and not earlier[1]):
+                index[path] = (rule[LINENO], forced, source)
+        yield rule
+
+DEFAULT_COMPACT_MIN = 3
+
+# Nodes of the source-path trie built by plan_splat_compaction are lists
+# indexed by these constants:
+#   CHILDREN  path segment -> child node
+#   COUNT     rules that match a path strictly below this node, plus the rule
+#             for the node's own path (which a splat may also match)
+#   MAPPINGS  (target prefix, status) -> how many of those rules are exactly
+#             `prefix + rest  target prefix + rest  status`
+#   FIRST     line number of the first rule that reached this node
+#   BLOCKED   an existing splat rule sits here, so nothing at or below it is
+#             compacted
+CHILDREN, COUNT, MAPPINGS, FIRST, BLOCKED = range(5)
+
+def plan_splat_compaction(rules, min_rules=DEFAULT_COMPACT_MIN):
+    # Returns source prefix -> (target prefix, status, first line, rule count)
+    # for the largest groups of rules that one `prefix*  target:splat` rule
+    # can replace without changing which rule answers any request it answered
+    # before. Every rule under the prefix must belong to the group, be
+    # unforced and unconditional, and share one target prefix and status. The
+    # splat goes on the group's first line, so a group is skipped when a
+    # placeholder, wildcard or absolute source that could match its paths
+    # comes later. The splat also answers paths under the prefix that no rule
+    # matched; being unforced, it never hides an existing file.
+    root = [{}, 0, Counter(), 0, False]
+    last_wild = 0
+    for rule in rules:
+        parts = rule_fields(rule) if not rule[DROPPED] else None
+        if parts is None:
+            continue
+        source = parts[0]
+        splat = source.endswith("/*")
+        if not source.startswith("/") or source == "/*" or "/:" in source or "*" in (source[:-1] if splat else source):
+            last_wild = rule[LINENO]
+            continue
+        if source == "/":
+            continue
+        segments = source[1:-2 if splat else None].split("/")
+        target = parts[1]
+        eligible = (
+            not splat
+            and not source.endswith("/")
+            and len(parts) <= 3
+            and not parts[-1].endswith("!")
+            and (target.startswith("/") or "://" in target)
+            and "?" not in target
+            and "#" not in target
+        )
+        status = parts[2] if len(parts) == 3 else ""
+
+        node = root
+        for depth, segment in enumerate(segments, 1):
+            child = node[CHILDREN].get(segment)
+            if child is None:
+                child = node[CHILDREN][segment] = [{}, 0, Counter(), rule[LINENO], False]
+            node = child
+            if splat and depth == len(segments):
+                node[BLOCKED] = True
+                break
+            node[COUNT] += 1
+            if eligible and depth < len(segments):
+                rest = "/".join(segments[depth:])
+                if target.endswith("/" + rest):
+                    node[MAPPINGS][target[:-len(rest)], status] += 1
+
+    plan = {}
+    stack = [(root, "/")]
+    while stack:
+        node, prefix = stack.pop()
+        for segment, child in node[CHILDREN].items():
+            if child[BLOCKED]:
+                continue
+            child_prefix = prefix + segment + "/"
+            if child[COUNT] >= min_rules and child[FIRST] > last_wild and child[MAPPINGS]:
+                (target, status), explained = child[MAPPINGS].most_common(1)[0]
+                if explained == child[COUNT]:
+                    plan[child_prefix] = (target, status, child[FIRST], explained)
+                    continue
+            stack.append((child, child_prefix))
+    return plan
+
+def compact_splats(rules, plan, stats):
+    # Applies plan_splat_compaction's plan: the first rule of each group
+    # becomes the splat rule and the rest of the group is DROPPED.
+    for rule in rules:
+        parts = rule_fields(rule) if not rule[DROPPED] else None
+        if parts is not None and parts[0].startswith("/"):
+            source = parts[0]
+            slash = source.find("/", 1)
+            while slash != -1:
+                group = plan.get(source[:slash + 1])
+                if group is not None:
+                    target, status, first, count = group
+                    splat_source = source[:slash + 1] + "*"
+                    if rule[LINENO] == first:
+                        splat_target = target + ":splat"
+                        old_url = rule[CHANGE][2] if rule[CHANGE] else parts[1]
+                        rule[PARTS] = [splat_source, splat_target, status] if status else [splat_source, splat_target]
+                        rule[CHANGE] = (first, splat_source, old_url, splat_target, status)
+                        stats.splat_groups.append((first, splat_source, splat_target, count))
+                    else:
+                        rule[PARTS] = parts
+                        rule[CHANGE] = None
+                        rule[DROPPED] = f"compacted into {splat_source} on line {first}"
+                    break
+                slash = source.find("/", slash + 1)
+        yield rule
+
+def rule_widths(rules):
+    max_from = 0
+    max_to = 0
+    for rule in rules:
+        parts = rule[PARTS]
+        if parts is not None and len(parts) == 3 and parts[1].startswith("https://") and not rule[DROPPED]:
+            max_from = max(max_from, len(parts[0]))
+            max_to = max(max_to, len(parts[1]))
+    return max_from, max_to
+
+def format_rule(rule, widths):
+    if rule[DROPPED]:
+        return ""
+    parts = rule[PARTS]
+    if widths is not None and parts is not None and len(parts) == 3 and parts[1].startswith("https://"):
+        from_url, to_url, status = parts
+        return f"{from_url.ljust(widths[0] + 2)}{to_url.ljust(widths[1] + 2)}{status}\n"
+    return rule_text(rule) + "\n"
+
+class Metrics:
+    """Per-phase wall time, CPU time, peak traced memory and bytes read/written.
+
+    Creating one starts tracemalloc, which slows the run down; it is only
+    used when `--metrics` is given.
+    """
+
+    def __init__(self):
+        import tracemalloc
+
+        self.phases = {}
+        self.started = time.perf_counter()
+        self.started_cpu = time.process_time()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def add(self, name, wall_s=0.0, cpu_s=0.0, peak_memory_bytes=0, bytes_read=0, bytes_written=0):
+        phase = self.phases.setdefault(
+            name, {"wall_s": 0.0, "cpu_s": 0.0, "peak_memory_bytes": 0, "bytes_read": 0, "bytes_written": 0}
+        )
+        phase["wall_s"] += wall_s
+        phase["cpu_s"] += cpu_s
+        phase["peak_memory_bytes"] = max(phase["peak_memory_bytes"], peak_memory_bytes)
+        phase["bytes_read"] += bytes_read
+        phase["bytes_written"] += bytes_written
+
+    @contextmanager
+    def phase(self, name):
+        # The body may fill in "bytes_read"/"bytes_written" on the yielded dict.
+        reset_memory_peak()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        io_counts = {}
+        yield io_counts
+        self.add(
+            name,
+            wall_s=time.perf_counter() - wall,
+            cpu_s=time.process_time() - cpu,
+            peak_memory_bytes=traced_memory_peak(),
+            **io_counts,
+        )
+
+    def report(self, **extra):
+        total = {
+            "wall_s": time.perf_counter() - self.started,
+            "cpu_s": time.process_time() - self.started_cpu,
+            "peak_memory_bytes": max((p["peak_memory_bytes"] for p in self.phases.values()), default=0),
+            "bytes_read": sum(p["bytes_read"] for p in self.phases.values()),
+            "bytes_written": sum(p["bytes_written"] for p in self.phases.values()),
+        }
+        return dict(extra, phases=self.phases, total=total)
+
+# Metrics and profiling modules (tracemalloc, cProfile, pstats, threading)
+# are imported where they are used, so a plain run does not pay their import
+# time; see benchmarks/bench_import_time.py.
+
+def reset_memory_peak():
+    import tracemalloc
+
+    # tracemalloc.reset_peak() exists from Python 3.9; before that peaks are
+    # cumulative since tracing started.
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+
+def traced_memory_peak():
+    import tracemalloc
+
+    return tracemalloc.get_traced_memory()[1]
+
+def metrics_phase(metrics, name):
+    return metrics.phase(name) if metrics is not None else nullcontext({})
+
+def write_metrics(metrics_path, report):
+    import json
+
+    with open(metrics_path, "w") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+
+class Profiler:
+    """cProfile, and optionally a stack sampler, around a block of work.
+
+    Writes `<name>.prof` (pstats), `<name>.txt` (top functions by cumulative
+    time) and, when `sample_ms` is set, `<name>.folded`: collapsed stacks
+    ("outer;inner count" per line) for flamegraph.pl or speedscope.
+    """
+
+    def __init__(self, profile_dir, name, sample_ms=None):
+        self.prefix = os.path.join(profile_dir, name)
+        self.sample_ms = sample_ms
+        self.samples = Counter()
+
+    def __enter__(self):
+        import cProfile
+        import threading
+
+        os.makedirs(os.path.dirname(self.prefix) or ".", exist_ok=True)
+        if self.sample_ms:
+            self._stop = threading.Event()
+            self._sampler = threading.Thread(target=self._sample, args=(threading.get_ident(),), daemon=True)
+            self._sampler.start()
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        import pstats
+
+        self.profile.disable()
+        if self.sample_ms:
+            self._stop.set()
+            self._sampler.join()
+            write_folded(self.prefix + ".folded", self.samples)
+        self.profile.dump_stats(self.prefix + ".prof")
+        write_profile_summary(self.prefix + ".txt", pstats.Stats(self.prefix + ".prof"))
+
+    def _sample(self, thread_id):
+        interval = self.sample_ms / 1000.0
+        while not self._stop.wait(interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+def profiling(profile_dir, name, sample_ms=None):
+    return Profiler(profile_dir, name, sample_ms) if profile_dir else nullcontext()
+
+def write_folded(path, samples):
+    with open(path, "w") as f:
+        for stack, count in sorted(samples.items()):
+            f.write(f"{stack} {count}\n")
+
+def write_profile_summary(path, stats):
+    with open(path, "w") as f:
+        stats.stream = f
+        stats.sort_stats("cumulative").print_stats(50)
+
+class UpdateStats:
+    """What update_redirects_file did to one `_redirects` file."""
+
+    def __init__(self):
+        self.replaced = 0
+        # --flatten-rules: hop count of every on-site destination before
+        # flattening, the rules flattened, and the chains that loop.
+        self.chain_hops = Counter()
+        self.chains_flattened = 0
+        self.chain_cycles = []
+        # --find-dead-rules/--prune: (line number, rule, reason) of every rule
+        # that can never fire.
+        self.dead_rules = []
+        # --compact-splats: (line, splat source, splat target, rules replaced).
+        self.splat_groups = []
+        # --source-csv: from paths renamed, and (line, path, new path, line
+        # already using it) for renames that collide.
+        self.sources_renamed = 0
+        self.source_conflicts = []
+
+def print_update_stats(stats, label="", pruned=False):
+    if stats.sources_renamed:
+        print(f"🔀 {label}{stats.sources_renamed} source path(s) renamed.")
+    for lineno, source, new_source, earlier in stats.source_conflicts:
+        print(f"⚠️  {label}Line {lineno}: not renaming {source} to {new_source}, already used on line {earlier}")
+    if stats.chain_hops:
+        histogram = ", ".join(
+            f"{hops} hop{'' if hops == 1 else 's'}: {count}" for hops, count in sorted(stats.chain_hops.items())
+        )
+        print(f"🔗 {label}Rule chains: {histogram}; {stats.chains_flattened} flattened")
+    for lineno, chain in stats.chain_cycles:
+        print(f"⚠️  {label}Redirect cycle starting at line {lineno}: {' → '.join(chain)}")
+    for lineno, text, reason in stats.dead_rules:
+        verb = "Dropped" if pruned else "Dead rule at"
+        print(f"🪦 {label}{verb} line {lineno} ({reason}): {text}")
+    for lineno, source, target, count in stats.splat_groups:
+        print(f"🗜️  {label}Compacted {count} rules into line {lineno}: {source}  {target}")
+
+# Settings the rule pipeline reads, with the CLI defaults. Parsed CLI
+# arguments carry all of them; embedders name only the ones they change.
+PIPELINE_DEFAULTS = {
+    "domain": [],
+    "pretty": True,
+    "report": "full",
+    "diff_engine": "linear",
+    "context": 0,
+    "flatten_rules": False,
+    "site_origin": None,
+    "max_chain_depth": DEFAULT_MAX_CHAIN_DEPTH,
+    "find_dead_rules": False,
+    "prune": False,
+    "compact_splats": False,
+    "compact_min": DEFAULT_COMPACT_MIN,
+    "all_targets": False,
+    "relative_targets": True,
+}
+
+def pipeline_options(options=None, **overrides):
+    # `options` is a mapping of settings, or an argparse.Namespace (or any
+    # object with some of these attributes, other attributes are ignored);
+    # missing settings get their defaults, keywords win over both. Unknown
+    # names in a mapping or keyword raise TypeError.
+    values = dict(PIPELINE_DEFAULTS)
+    if isinstance(options, Mapping):
+        overrides = {**options, **overrides}
+    elif options is not None:
+        for name in PIPELINE_DEFAULTS:
+            if hasattr(options, name):
+                values[name] = getattr(options, name)
+    unknown = sorted(name for name in overrides if name not in PIPELINE_DEFAULTS)
+    if unknown:
+        raise TypeError(f"unknown pipeline option(s): {', '.join(unknown)}")
+    values.update(overrides)
+    # Without a site_origin only relative destinations count as on-site.
+    if values["site_origin"]:
+        values["site_origin"] = values["site_origin"].rstrip("/")
+    return SimpleNamespace(**values)
+
+def rule_pipeline(lines, url_map, args, domain_filter, rule_index=None, stats=None, compaction=None, source_map=None, source_index=None):
+    rules = rewrite_rules(parse_rules(lines), url_map, domain_filter, args.all_targets, args.site_origin, args.relative_targets)
+    if source_map:
+        rules = rewrite_sources(rules, source_index, stats)
+    if rule_index is not None:
+        rules = flatten_rule_chains(rules, rule_index, args.site_origin, args.max_chain_depth, stats)
+    if args.find_dead_rules or args.prune:
+        rules = find_dead_rules(rules, args.prune, stats)
+    if compaction:
+        rules = compact_splats(rules, compaction, stats)
+    return rules
+
+def prepare_pipeline(lines, url_map, args, source_map=None, metrics=None, input_size=0):
+    # The read passes that must see every rule before the first one is
+    # written: the renames --source-csv applies, the rule index for
+    # --flatten-rules and the --compact-splats plan. Returns the domain
+    # filter, rule index, compaction plan and source index that rule_pipeline
+    # takes.
+    domain_filter = compile_domain_filter(args.domain)
+
+    source_index = None
+    if source_map:
+        with metrics_phase(metrics, "source_index") as io_counts:
+            source_index = index_sources(parse_rules(lines), source_map)
+            io_counts["bytes_read"] = input_size
+
+    rule_index = None
+    if args.flatten_rules:
+        with metrics_phase(metrics, "rule_index") as io_counts:
+            rules = rewrite_rules(parse_rules(lines), url_map, domain_filter, args.all_targets, args.site_origin, args.relative_targets)
+            if source_map:
+                rules = rewrite_sources(rules, source_index, UpdateStats())
+            rule_index = build_rule_index(rules, args.site_origin)
+            io_counts["bytes_read"] = input_size
+
+    compaction = None
+    if args.compact_splats:
+        with metrics_phase(metrics, "compaction_plan") as io_counts:
+            compaction = plan_splat_compaction(rule_pipeline(lines, url_map, args, domain_filter, rule_index, UpdateStats(), source_map=source_map, source_index=source_index), args.compact_min)
+            io_counts["bytes_read"] = input_size
+    return domain_filter, rule_index, compaction, source_index
+
+def needs_prepass(args, source_map=None):
+    return args.flatten_rules or args.compact_splats or bool(source_map)
+
+def rewrite_redirects(lines, url_map, options=None, source_map=None, stats=None):
+    """Rewrite `_redirects` rules in memory.
+
+    Iterator in, iterator out: `lines` is any iterable of `_redirects` lines
+    and one rule record is yielded per line. CHANGE holds the (line number,
+    from path, old target, new target, status) event of a replaced target,
+    RENAMED the old from path of a renamed source and DROPPED the reason a
+    pruned rule was removed. Nothing is read from or written to disk.
+
+    With flatten_rules or compact_splats `lines` is read twice; lists and
+    other re-iterables are re-read, one-shot iterators are buffered first.
+    """
+    options = pipeline_options(options)
+    if stats is None:
+        stats = UpdateStats()
+    if needs_prepass(options, source_map) and iter(lines) is lines:
+        lines = list(lines)
+    domain_filter, rule_index, compaction, source_index = prepare_pipeline(lines, url_map, options, source_map)
+    return rule_pipeline(lines, url_map, options, domain_filter, rule_index, stats, compaction, source_map, source_index)
+
+def update_redirects(lines, url_map, options=None, source_map=None, stats=None):
+    # rewrite_redirects plus output formatting: yields (output text, rule)
+    # pairs, the text empty for pruned rules. Pretty output needs the column
+    # widths before the first line, so it reads `lines` once more.
+    options = pipeline_options(options)
+    if stats is None:
+        stats = UpdateStats()
+    if (options.pretty or needs_prepass(options, source_map)) and iter(lines) is lines:
+        lines = list(lines)
+    domain_filter, rule_index, compaction, source_index = prepare_pipeline(lines, url_map, options, source_map)
+    widths = None
+    if options.pretty:
+        widths = rule_widths(rule_pipeline(lines, url_map, options, domain_filter, rule_index, UpdateStats(), compaction, source_map, source_index))
+    for rule in rule_pipeline(lines, url_map, options, domain_filter, rule_index, stats, compaction, source_map, source_index):
+        if rule[CHANGE]:
+            stats.replaced += 1
+        yield format_rule(rule, widths), rule
+
+class FileLines:
+    """The lines of a file, re-read from disk on every iteration."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        with open(self.path, "r") as f:
+            yield from f
+
+def is_path(target):
+    return isinstance(target, (str, os.PathLike))
+
+def same_file(a, b):
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False
+
+def update_redirects_file(redirects_path, output_path, diff_path, url_map, args, metrics=None, source_map=None):
+    # Streaming pipeline: parse -> rewrite -> format -> write, with the diff or
+    # report written alongside. Memory stays proportional to one line plus the
+    # URL map; pretty output costs an extra width-collecting read of the input,
+    # --flatten-rules one more to index the rules by source path and
+    # --compact-splats one more to plan the splat groups.
+    #
+    # For pipes, `redirects_path` may be any iterable of lines (sys.stdin) and
+    # `output_path`/`diff_path` open file objects (sys.stdout); `diff_path` is
+    # None to skip the diff. An input that can only be read once is buffered
+    # in memory when one of the extra reads above needs it.
+    #
+    # The final pass re-reads the input, so when `output_path` is the input
+    # file itself the rules are written to a temporary file next to it, which
+    # replaces the input once the pass is complete.
+    args = pipeline_options(args)
+    stats = UpdateStats()
+    htmldiff = diff_path is not None and args.report == "full" and args.diff_engine == "htmldiff"
+    if is_path(redirects_path):
+        input_size = os.path.getsize(redirects_path)
+        lines = FileLines(redirects_path)
+    else:
+        # Bytes read/written through pipes are not counted in the metrics.
+        input_size = 0
+        lines = redirects_path
+        if (args.pretty or needs_prepass(args, source_map) or htmldiff) and iter(lines) is lines:
+            lines = list(lines)
+    domain_filter, rule_index, compaction, source_index = prepare_pipeline(lines, url_map, args, source_map, metrics, input_size)
+
+    if htmldiff:
+        # HtmlDiff needs both complete line lists, so this path is not streamed.
+        with metrics_phase(metrics, "parse_rewrite") as io_counts:
+            original_lines = list(lines)
+            rules = list(rule_pipeline(original_lines, url_map, args, domain_filter, rule_index, stats, compaction, source_map, source_index))
+            updated_lines = [rule_text(rule) + "\n" for rule in rules if not rule[DROPPED]]
+            io_counts["bytes_read"] = input_size
+        with metrics_phase(metrics, "format"):
+            widths = rule_widths(rules) if args.pretty else None
+            formatted = [format_rule(rule, widths) for rule in rules]
+        with metrics_phase(metrics, "write_output") as io_counts:
+            out, owns_output = open_output(output_path)
+            out.writelines(formatted)
+            if owns_output:
+                out.close()
+                io_counts["bytes_written"] = os.path.getsize(output_path)
+        with metrics_phase(metrics, "diff") as io_counts:
+            write_diff(original_lines, updated_lines, diff_path, args.diff_engine)
+            if is_path(diff_path):
+                io_counts["bytes_written"] = os.path.getsize(diff_path)
+        stats.replaced = sum(1 for rule in rules if rule[CHANGE])
+        return stats
+
+    widths = None
+    if args.pretty:
+        with metrics_phase(metrics, "width_pass") as io_counts:
+            # Chain statistics are collected on the final pass only.
+            widths = rule_widths(rule_pipeline(lines, url_map, args, domain_filter, rule_index, UpdateStats(), compaction, source_map, source_index))
+            io_counts["bytes_read"] = input_size
+
+    if diff_path is None:
+        sink = None
+    elif args.report == "changes":
+        sink = ReportWriter(diff_path, args.context)
+    else:
+        sink = DiffWriter(diff_path)
+    target = output_path
+    if is_path(redirects_path) and is_path(output_path) and same_file(redirects_path, output_path):
+        fd, target = tempfile.mkstemp(prefix=".redirects-", suffix=".tmp", dir=os.path.dirname(os.path.abspath(output_path)))
+        os.close(fd)
+        shutil.copymode(output_path, target)
+    out, owns_output = open_output(target)
+    completed = False
+    try:
+        with sink or nullcontext():
+            add = sink.add if sink is not None else skip_rule
+            rules = rule_pipeline(lines, url_map, args, domain_filter, rule_index, stats, compaction, source_map, source_index)
+            if metrics is not None:
+                stats.replaced = instrumented_rewrite_pass(rules, widths, out.write, add, metrics)
+            else:
+                replaced = 0
+                write = out.write
+                for rule in rules:
+                    write(format_rule(rule, widths))
+                    add(rule)
+                    if rule[CHANGE]:
+                        replaced += 1
+                stats.replaced = replaced
+        completed = True
+    finally:
+        if owns_output:
+            out.close()
+        if target is not output_path:
+            if completed:
+                os.replace(target, output_path)
+            else:
+                os.remove(target)
+    if metrics is not None:
+        metrics.add("parse_rewrite", bytes_read=input_size)
+        metrics.add("write_output", bytes_written=os.path.getsize(output_path) if owns_output else 0)
+        metrics.add("diff", bytes_written=os.path.getsize(diff_path) if is_path(diff_path) else 0)
+    return stats
+
+def skip_rule(rule):
+    # Diff sink used when no diff is written.
+    pass
+
+def instrumented_rewrite_pass(rules, widths, write, add, metrics):
+    # The streaming stages are interleaved line by line, so each one is timed
+    # with a perf_counter tick between stages. CPU time is split between the
+    # stages in proportion to their wall time, and the pass's peak memory is
+    # reported for every stage.
+    clock = time.perf_counter
+    spent = {"parse_rewrite": 0.0, "format": 0.0, "write_output": 0.0, "diff": 0.0}
+    replaced = 0
+    reset_memory_peak()
+    cpu = time.process_time()
+    t0 = clock()
+    for rule in rules:
+        t1 = clock()
+        text = format_rule(rule, widths)
+        t2 = clock()
+        write(text)
+        t3 = clock()
+        add(rule)
+        t4 = clock()
+        spent["parse_rewrite"] += t1 - t0
+        spent["format"] += t2 - t1
+        spent["write_output"] += t3 - t2
+        spent["diff"] += t4 - t3
+        if rule[CHANGE]:
+            replaced += 1
+        t0 = t4
+    spent["parse_rewrite"] += clock() - t0
+    cpu = time.process_time() - cpu
+    wall = sum(spent.values()) or 1.0
+    peak = traced_memory_peak()
+    for name, wall_s in spent.items():
+        metrics.add(name, wall_s=wall_s, cpu_s=cpu * wall_s / wall, peak_memory_bytes=peak)
+    return replaced
+
+DIFF_HEADER = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Redirects Diff</title>
+<style>
+  body { font-family: monospace; font-size: 13px; }
+  table { border-collapse: collapse; width: 100%; table-layout: fixed; }
+  th { background: #eee; text-align: left; padding: 2px 6px; }
+  td { padding: 1px 6px; white-space: pre-wrap; word-break: break-all; vertical-align: top; }
+  td.n { width: 4em; color: #999; text-align: right; }
+  tr.chg td.old { background: #ffdddd; }
+  tr.chg td.new { background: #ddffdd; }
+</style>
+</head>
+<body>
+<table>
+<tr><th></th><th>Original</th><th></th><th>Updated</th></tr>
+"""
+
+DIFF_FOOTER = """</table>
+<p>{changed} changed line(s) out of {total}.</p>
+</body>
+</html>
+"""
+
+def open_output(target):
+    # Paths are opened for writing and closed by the writer; open file objects
+    # (io.StringIO, sys.stdout) are written to as they are and left open.
+    if hasattr(target, "write"):
+        return target, False
+    return open(target, "w"), True
+
+class DiffWriter:
+    """Streams the full-file diff table, one row per line pair."""
+
+    def __init__(self, diff_path):
+        self.f, self.owns_file = open_output(diff_path)
+        self.f.write(DIFF_HEADER)
+        self.changed = 0
+        self.total = 0
+
+    def add(self, rule):
+        if rule[DROPPED]:
+            self.add_row(rule[LINENO], rule[LINE], "", True)
+        else:
+            self.add_row(rule[LINENO], rule[LINE], rule_text(rule), rule[CHANGE] is not None or rule[RENAMED] is not None)
+
+    def add_row(self, lineno, old, new, changed):
+        # Lines pair up 1:1 by line number, so no sequence alignment is needed.
+        old = old.rstrip("\n")
+        new = new.rstrip("\n")
+        row_class = ""
+        if changed:
+            row_class = ' class="chg"'
+            self.changed += 1
+        self.total = lineno
+        self.f.write(
+            f'<tr{row_class}><td class="n">{lineno}</td><td class="old">{escape(old)}</td>'
+            f'<td class="n">{lineno}</td><td class="new">{escape(new)}</td></tr>\n'
+        )
+
+    def close(self):
+        self.f.write(DIFF_FOOTER.format(changed=self.changed, total=self.total))
+        if self.owns_file:
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def write_diff(original, updated, diff_path, engine="linear"):
+    if engine == "htmldiff":
+        from difflib import HtmlDiff
+
+        html_diff = HtmlDiff(wrapcolumn=100).make_file(original, updated, fromdesc="Original", todesc="Updated")
+        f, owns_file = open_output(diff_path)
+        f.write(html_diff)
+        if owns_file:
+            f.close()
+        return
+
+    with DiffWriter(diff_path) as writer:
+        for lineno, (old, new) in enumerate(zip_longest(original, updated, fillvalue=""), 1):
+            # Whitespace-only changes come from column re-alignment, not from a
+            # replacement, so they are not highlighted.
+            writer.add_row(lineno, old, new, old != new and old.split() != new.split())
+
+REPORT_HEADER = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Redirects Report</title>
+<style>
+  body { font-family: monospace; font-size: 13px; }
+  table { border-collapse: collapse; width: 100%; }
+  th { background: #eee; text-align: left; padding: 2px 6px; }
+  td { padding: 1px 6px; white-space: pre-wrap; word-break: break-all; vertical-align: top; }
+  td.n { width: 4em; color: #999; text-align: right; }
+  td.old { background: #ffdddd; }
+  td.new { background: #ddffdd; }
+  tr.ctx td { color: #999; }
+  tr.gap td { background: #f6f6f6; height: 4px; padding: 0; }
+</style>
+</head>
+<body>
+<table>
+<tr><th>Line</th><th>From</th><th>Old target</th><th>New target</th><th>Status</th></tr>
+"""
+
+REPORT_FOOTER = """</table>
+<p>{summary}.</p>
+</body>
+</html>
+"""
+
+class ReportWriter:
+    """Streams the changed-rules-only report.
+
+    Only replaced, renamed and pruned rules are listed, each with up to
+    `context` surrounding lines from the original file. Leading context is
+    held in a small ring buffer, so rows are written as lines arrive.
+    """
+
+    def __init__(self, report_path, context=0):
+        self.f, self.owns_file = open_output(report_path)
+        self.f.write(REPORT_HEADER)
+        self.context = context
+        self.before = deque(maxlen=context)
+        self.after = 0
+        self.last_written = 0
+        self.replaced = 0
+        self.dropped = 0
+        self.renamed = 0
+
+    def add(self, rule):
+        lineno, line, parts, change, dropped, renamed = rule
+        if change is None and dropped is None and renamed is None:
+            if self.after:
+                self._write_context(lineno, line)
+                self.after -= 1
+            elif self.context:
+                self.before.append((lineno, line))
+            return
+
+        first = self.before[0][0] if self.before else lineno
+        if self.last_written and first > self.last_written + 1:
+            self.f.write('<tr class="gap"><td colspan="5"></td></tr>\n')
+        for ctx_lineno, ctx_line in self.before:
+            self._write_context(ctx_lineno, ctx_line)
+        self.before.clear()
+
+        if dropped is not None:
+            from_url, old_url, new_url, status = parts[0], parts[1], f"(removed: {dropped})", " ".join(parts[2:])
+            self.dropped += 1
+        elif change is not None:
+            _, from_url, old_url, new_url, status = change
+            self.replaced += 1
+        else:
+            from_url, old_url, new_url, status = parts[0], parts[1], parts[1], " ".join(parts[2:])
+        if renamed is not None and dropped is None:
+            from_url = f"{renamed} → {parts[0]}"
+            self.renamed += 1
+        self.f.write(
+            f'<tr><td class="n">{lineno}</td><td>{escape(from_url)}</td><td class="old">{escape(old_url)}</td>'
+            f'<td class="new">{escape(new_url)}</td><td>{escape(status)}</td></tr>\n'
+        )
+        self.last_written = lineno
+        self.after = self.context
+
+    def _write_context(self, lineno, line):
+        self.f.write(f'<tr class="ctx"><td class="n">{lineno}</td><td colspan="4">{escape(line.rstrip())}</td></tr>\n')
+        self.last_written = lineno
+
+    def close(self):
+        summary = f"{self.replaced} replacement(s)"
+        if self.renamed:
+            summary += f", {self.renamed} source(s) renamed"
+        if self.dropped:
+            summary += f", {self.dropped} rule(s) removed"
+        self.f.write(REPORT_FOOTER.format(summary=summary))
+        if self.owns_file:
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
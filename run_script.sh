@@ -1,44 +1,131 @@
 #!/bin/bash
+#
+# Usage:
+#   ./run_script.sh                 Interactive: prompts for the mode and a confirmation
+#   ./run_script.sh --mode bulk --batch [options] [-- extra updater arguments]
+#
+# Options (each can also be set through the environment variable shown):
+#   --mode MODE         `single` (or 1) or `bulk` (or 2)              NRU_MODE
+#   --batch, --yes      Never prompt; fail instead of asking          NRU_BATCH=1
+#   --csv FILE          Single: CSV map (default: redirects.csv)      NRU_CSV
+#   --redirects FILE    Single: input file (default: _redirects)      NRU_REDIRECTS
+#   --output-dir DIR    Single: output folder (default: ./output)     NRU_OUTPUT_DIR
+#   --projects DIR      Bulk: projects folder (default: ./projects)   NRU_PROJECTS_DIR
+#   --global-csv FILE   Bulk: CSV map shared by every folder          NRU_GLOBAL_CSV
+#   --domain LIST       Only update targets on these hosts            NRU_DOMAIN
+#   --workers N         Bulk: worker processes                        NRU_WORKERS
+#   --report TYPE       `full` diff (default) or `changes` only       NRU_REPORT
+#   --context N         Context lines in the changes report           NRU_CONTEXT
+# Anything after `--` is passed to the updater unchanged.
+#
+# Exit codes:
+#   0  success
+#   1  the updater failed (bulk: at least one folder failed)
+#   2  invalid option or mode
+#   3  required input files missing
+#   4  virtual environment setup failed
+#   5  cancelled at the confirmation prompt
+
+EXIT_UPDATE=1
+EXIT_USAGE=2
+EXIT_INPUT=3
+EXIT_ENV=4
+EXIT_CANCELLED=5
+
+MODE="${NRU_MODE:-}"
+BATCH="${NRU_BATCH:-0}"
+CSV="${NRU_CSV:-redirects.csv}"
+REDIRECTS="${NRU_REDIRECTS:-_redirects}"
+OUTPUT_DIR="${NRU_OUTPUT_DIR:-./output}"
+PROJECTS_DIR="${NRU_PROJECTS_DIR:-./projects}"
+GLOBAL_CSV="${NRU_GLOBAL_CSV:-}"
+DOMAIN="${NRU_DOMAIN:-}"
+WORKERS="${NRU_WORKERS:-}"
+REPORT="${NRU_REPORT:-}"
+CONTEXT="${NRU_CONTEXT:-}"
+EXTRA_ARGS=()
+
+usage_error() {
+  echo "❌ $1"
+  echo "   See the header of $0 for the available options."
+  exit $EXIT_USAGE
+}
+
+while [ $# -gt 0 ]; do
+  case "$1" in
+    --mode) [ $# -ge 2 ] || usage_error "--mode needs a value"; MODE="$2"; shift 2 ;;
+    --batch|--yes|-y) BATCH=1; shift ;;
+    --csv) [ $# -ge 2 ] || usage_error "--csv needs a value"; CSV="$2"; shift 2 ;;
+    --redirects) [ $# -ge 2 ] || usage_error "--redirects needs a value"; REDIRECTS="$2"; shift 2 ;;
+    --output-dir) [ $# -ge 2 ] || usage_error "--output-dir needs a value"; OUTPUT_DIR="$2"; shift 2 ;;
+    --projects) [ $# -ge 2 ] || usage_error "--projects needs a value"; PROJECTS_DIR="$2"; shift 2 ;;
+    --global-csv) [ $# -ge 2 ] || usage_error "--global-csv needs a value"; GLOBAL_CSV="$2"; shift 2 ;;
+    --domain) [ $# -ge 2 ] || usage_error "--domain needs a value"; DOMAIN="${DOMAIN:+$DOMAIN,}$2"; shift 2 ;;
+    --workers) [ $# -ge 2 ] || usage_error "--workers needs a value"; WORKERS="$2"; shift 2 ;;
+    --report) [ $# -ge 2 ] || usage_error "--report needs a value"; REPORT="$2"; shift 2 ;;
+    --context) [ $# -ge 2 ] || usage_error "--context needs a value"; CONTEXT="$2"; shift 2 ;;
+    --) shift; EXTRA_ARGS=("$@"); break ;;
+    *) usage_error "Unknown option: $1" ;;
+  esac
+done
+
+case "$MODE" in
+  single) MODE="1" ;;
+  bulk) MODE="2" ;;
+esac
 
 echo "=========================================="
 echo " Netlify Redirect Updater"
 echo "=========================================="
-echo "Choose mode:"
-echo "1) Single-site update"
-echo "2) Bulk project update"
-read -p "Enter 1 or 2: " MODE
+if [ -z "$MODE" ]; then
+  if [ "$BATCH" == "1" ]; then
+    usage_error "--mode is required in batch mode"
+  fi
+  echo "Choose mode:"
+  echo "1) Single-site update"
+  echo "2) Bulk project update"
+  read -p "Enter 1 or 2: " MODE
+fi
 
 if [ "$MODE" != "1" ] && [ "$MODE" != "2" ]; then
   echo "❌ Invalid choice. Exiting."
-  exit 1
+  exit $EXIT_USAGE
 fi
 
 echo ""
 echo "✅ Requirements Checklist:"
 if [ "$MODE" == "1" ]; then
-  echo "- redirects.csv file in the current folder"
-  echo "- _redirects file in the current folder"
+  echo "- $CSV file"
+  echo "- $REDIRECTS file"
   echo "- CSV must have a header row: old_url,new_url"
 
-  [ -f "redirects.csv" ] || { echo "❌ Missing redirects.csv"; exit 1; }
-  [ -f "_redirects" ] || { echo "❌ Missing _redirects"; exit 1; }
+  [ -f "$CSV" ] || { echo "❌ Missing $CSV"; exit $EXIT_INPUT; }
+  [ -f "$REDIRECTS" ] || { echo "❌ Missing $REDIRECTS"; exit $EXIT_INPUT; }
 
 else
-  echo "- /projects/ folder in the current directory"
+  echo "- $PROJECTS_DIR folder"
   echo "- Each subfolder must contain:"
   echo "    - _redirects"
-  echo "    - redirects.csv"
+  if [ -n "$GLOBAL_CSV" ]; then
+    echo "    - redirects.csv (optional with the shared $GLOBAL_CSV)"
+  else
+    echo "    - redirects.csv"
+  fi
   echo "- CSVs must have a header row: old_url,new_url"
 
-  if [ ! -d "projects" ]; then
-    echo "❌ Missing projects/ directory"
-    exit 1
+  if [ ! -d "$PROJECTS_DIR" ]; then
+    echo "❌ Missing $PROJECTS_DIR directory"
+    exit $EXIT_INPUT
+  fi
+  if [ -n "$GLOBAL_CSV" ] && [ ! -f "$GLOBAL_CSV" ]; then
+    echo "❌ Missing $GLOBAL_CSV"
+    exit $EXIT_INPUT
   fi
 
   errors=0
-  for folder in projects/*; do
+  for folder in "$PROJECTS_DIR"/*; do
     [ -d "$folder" ] || continue
-    if [ ! -f "$folder/redirects.csv" ] || [ ! -f "$folder/_redirects" ]; then
+    if [ ! -f "$folder/_redirects" ] || { [ -z "$GLOBAL_CSV" ] && [ ! -f "$folder/redirects.csv" ]; }; then
       echo "❌ Missing required files in $folder"
       errors=$((errors+1))
     fi
@@ -46,39 +133,123 @@ else
 
   if [ "$errors" -gt 0 ]; then
     echo "❌ $errors project folder(s) are missing required files."
-    exit 1
+    exit $EXIT_INPUT
   fi
 fi
 
-read -p "Continue? (y/n): " CONFIRM
-if [ "$CONFIRM" != "y" ]; then
-  echo "❌ Cancelled."
-  exit 1
+if [ "$BATCH" != "1" ]; then
+  read -p "Continue? (y/n): " CONFIRM
+  if [ "$CONFIRM" != "y" ]; then
+    echo "❌ Cancelled."
+    exit $EXIT_CANCELLED
+  fi
 fi
 
 # Setup virtual environment
-VENV_DIR="venv"
-if [ ! -d "$VENV_DIR" ]; then
-  echo "🔧 Creating virtual environment..."
-  python3 -m venv "$VENV_DIR"
+#
+# Environments are cached outside the checkout, keyed by a hash of
+# requirements.txt and the Python version, and reused until either changes.
+# NRU_ENV_CACHE overrides the cache location; NRU_REBUILD_ENV=1 forces a
+# rebuild. For air-gapped hosts, fill a wheelhouse on a connected machine with
+#   pip download -r requirements.txt -d wheelhouse
+# and set NRU_WHEELHOUSE (default: ./wheelhouse when it exists); pip then
+# installs from it with --no-index and never touches the network.
+ENV_CACHE="${NRU_ENV_CACHE:-${XDG_CACHE_HOME:-$HOME/.cache}/netlify-redirect-updater/envs}"
+WHEELHOUSE="${NRU_WHEELHOUSE:-}"
+if [ -z "$WHEELHOUSE" ] && [ -d "wheelhouse" ]; then
+  WHEELHOUSE="wheelhouse"
 fi
 
-source "$VENV_DIR/bin/activate"
+ENV_KEY=$(python3 -c 'import hashlib, sys; print(hashlib.sha256(open("requirements.txt", "rb").read() + sys.version.encode()).hexdigest()[:16])') || {
+  echo "❌ Could not hash requirements.txt"
+  exit $EXIT_ENV
+}
+VENV_DIR="$ENV_CACHE/$ENV_KEY"
+
+# Concurrent runs (cron, CI matrices) must not build the same environment at
+# once: the build happens under a lock directory (mkdir is atomic, and unlike
+# flock it exists everywhere). Runs that find it taken wait up to
+# NRU_ENV_LOCK_TIMEOUT seconds (default 600); a lock whose owner has died is
+# taken over. Venvs cannot be moved once built, so the lock guards an
+# in-place build rather than a build elsewhere followed by a rename.
+ENV_LOCK="$VENV_DIR.lock"
+ENV_LOCK_TIMEOUT="${NRU_ENV_LOCK_TIMEOUT:-600}"
+ENV_LOCK_HELD=0
+
+release_env_lock() {
+  rm -rf "$ENV_LOCK"
+}
 
-# Install dependencies
-echo "📦 Installing requirements..."
-pip install -r requirements.txt
+acquire_env_lock() {
+  mkdir -p "$ENV_CACHE"
+  local waited=0 owner
+  until mkdir "$ENV_LOCK" 2>/dev/null; do
+    owner=$(cat "$ENV_LOCK/pid" 2>/dev/null)
+    if [ -n "$owner" ] && ! kill -0 "$owner" 2>/dev/null; then
+      echo "🔓 Removing stale environment lock left by process $owner"
+      release_env_lock
+      continue
+    fi
+    if [ "$waited" -ge "$ENV_LOCK_TIMEOUT" ]; then
+      echo "❌ Timed out waiting for $ENV_LOCK"
+      exit $EXIT_ENV
+    fi
+    [ "$waited" -eq 0 ] && echo "⏳ Waiting for another run to finish building the environment..."
+    sleep 1
+    waited=$((waited + 1))
+  done
+  echo $$ > "$ENV_LOCK/pid"
+  ENV_LOCK_HELD=1
+  trap release_env_lock EXIT
+}
+
+if [ "${NRU_REBUILD_ENV:-0}" == "1" ] || [ ! -f "$VENV_DIR/.complete" ]; then
+  acquire_env_lock
+  if [ "${NRU_REBUILD_ENV:-0}" == "1" ]; then
+    rm -rf "$VENV_DIR"
+  fi
+fi
+
+if [ -f "$VENV_DIR/.complete" ]; then
+  # Cached, or built by the run we waited for.
+  echo "♻️  Reusing cached environment $VENV_DIR"
+else
+  echo "🔧 Creating virtual environment in $VENV_DIR..."
+  # The .complete marker is written last, so an interrupted install is
+  # rebuilt from scratch next time instead of being reused.
+  rm -rf "$VENV_DIR"
+  python3 -m venv "$VENV_DIR" || { rm -rf "$VENV_DIR"; echo "❌ Could not create virtual environment"; exit $EXIT_ENV; }
+
+  if grep -Eqv '^[[:space:]]*(#|$)' requirements.txt; then
+    echo "📦 Installing requirements..."
+    if [ -n "$WHEELHOUSE" ]; then
+      "$VENV_DIR/bin/pip" install --no-index --find-links "$WHEELHOUSE" -r requirements.txt
+    else
+      "$VENV_DIR/bin/pip" install -r requirements.txt
+    fi || { rm -rf "$VENV_DIR"; echo "❌ Installing requirements failed"; exit $EXIT_ENV; }
+  fi
+
+  touch "$VENV_DIR/.complete"
+fi
+
+if [ "$ENV_LOCK_HELD" == "1" ]; then
+  release_env_lock
+  trap - EXIT
+fi
+
+source "$VENV_DIR/bin/activate"
 
 # Run appropriate script
+UPDATER_ARGS=()
+[ -n "$DOMAIN" ] && UPDATER_ARGS+=(--domain "$DOMAIN")
+[ -n "$REPORT" ] && UPDATER_ARGS+=(--report "$REPORT")
+[ -n "$CONTEXT" ] && UPDATER_ARGS+=(--context "$CONTEXT")
+
 if [ "$MODE" == "1" ]; then
-  OUTPUT_DIR="./output"
   mkdir -p "$OUTPUT_DIR"
 
-  CSV="redirects.csv"
-  REDIRECTS="_redirects"
   OUTPUT="$OUTPUT_DIR/_redirects_updated"
   DIFF="$OUTPUT_DIR/redirects_diff.html"
-  DOMAIN=""
 
   echo "🚀 Running single-site update..."
   python3 update_netlify_redirects.py \
@@ -86,23 +257,29 @@ if [ "$MODE" == "1" ]; then
     --redirects "$REDIRECTS" \
     --output "$OUTPUT" \
     --diff "$DIFF" \
-    --domain "$DOMAIN"
+    "${UPDATER_ARGS[@]}" "${EXTRA_ARGS[@]}"
+  STATUS=$?
 
-  echo ""
-  echo "📂 Output written to: $OUTPUT_DIR"
-  echo "🔎 View diff file: file://$(pwd)/$DIFF"
+  if [ $STATUS -eq 0 ]; then
+    echo ""
+    echo "📂 Output written to: $OUTPUT_DIR"
+    echo "🔎 View diff file: file://$(cd "$OUTPUT_DIR" && pwd)/redirects_diff.html"
+  fi
 
 else
-  PROJECTS_DIR="./projects"
-  DOMAIN=""
+  [ -n "$GLOBAL_CSV" ] && UPDATER_ARGS+=(--global-csv "$GLOBAL_CSV")
+  [ -n "$WORKERS" ] && UPDATER_ARGS+=(--workers "$WORKERS")
 
   echo "🚀 Running bulk project update..."
   python3 bulk_update_redirects.py \
     --projects-folder "$PROJECTS_DIR" \
-    --domain "$DOMAIN"
+    "${UPDATER_ARGS[@]}" "${EXTRA_ARGS[@]}"
+  STATUS=$?
 fi
 
-# Clean up virtual environment
-echo "🧹 Cleaning up virtual environment..."
 deactivate
-rm -rf "$VENV_DIR"
+
+if [ $STATUS -ne 0 ]; then
+  echo "❌ Update failed (exit status $STATUS)."
+  exit $EXIT_UPDATE
+fi
@@ -0,0 +1,35 @@
+from redirects_core import CHANGE, UpdateStats, pipeline_options, update_redirects
+
+ORIGIN = "https://www.example.com"
+URL_MAP = {
+    f"{ORIGIN}/old": f"{ORIGIN}/new",
+    "http://shop.example.com/x": "https://shop.example.com/x",
+    "/rel": "/rel-new",
+}
+
+def rewrite(text, **options):
+    options = pipeline_options(pretty=False, all_targets=True, **options)
+    pairs = list(update_redirects(text.splitlines(True), URL_MAP, options, stats=UpdateStats()))
+    return "".join(line for line, _ in pairs), [rule[CHANGE] for _, rule in pairs]
+
+def test_relative_target_on_origin_stays_relative():
+    output, changes = rewrite("/a /old 301\n", site_origin=ORIGIN)
+    assert output == "/a  /new  301\n"
+    assert changes == [(1, "/a", "/old", "/new", "301")]
+
+def test_http_target_is_rewritten():
+    output, _ = rewrite("/a http://shop.example.com/x 301\n")
+    assert output == "/a  https://shop.example.com/x  301\n"
+
+def test_relative_target_without_origin_is_looked_up_as_is():
+    output, _ = rewrite("/a /rel 301\n")
+    assert output == "/a  /rel-new  301\n"
+
+def test_relative_lookups_can_be_turned_off():
+    output, changes = rewrite("/a /rel 301\n", relative_targets=False)
+    assert output == "/a /rel 301\n"
+    assert changes == [None]
+
+def test_other_targets_left_alone_without_all_targets():
+    pairs = list(update_redirects(["/a /rel 301\n"], URL_MAP, pipeline_options(pretty=False)))
+    assert pairs[0][0] == "/a /rel 301\n"
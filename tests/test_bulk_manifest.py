@@ -0,0 +1,62 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bulk_update_redirects.py")
+
+@pytest.fixture
+def projects(tmp_path):
+    for name in ("site-a", "site-b"):
+        folder = tmp_path / name
+        folder.mkdir()
+        (folder / "_redirects").write_text(f"/{name} https://old.example.com/{name} 301\n")
+        (folder / "redirects.csv").write_text(f"old_url,new_url\nhttps://old.example.com/{name},https://new.example.com/{name}\n")
+    return tmp_path
+
+def run(projects, *args):
+    result = subprocess.run(
+        [sys.executable, SCRIPT, "--projects-folder", str(projects), "--no-cache", *args],
+        capture_output=True, text=True, check=True,
+    )
+    # Names of the folders skipped as unchanged.
+    return sorted(os.path.basename(line.split(": unchanged")[0]) for line in result.stdout.splitlines() if "unchanged, skipped" in line)
+
+def test_unchanged_folders_are_skipped(projects):
+    assert run(projects) == []
+    assert (projects / "site-a" / "_redirects_updated").read_text().split() == ["/site-a", "https://new.example.com/site-a", "301"]
+    manifest = json.loads((projects / ".redirects_manifest.json").read_text())
+    assert sorted(manifest["folders"]) == ["site-a", "site-b"]
+    assert run(projects) == ["site-a", "site-b"]
+
+def test_changed_input_is_reprocessed(projects):
+    run(projects)
+    (projects / "site-a" / "_redirects").write_text("/x https://old.example.com/site-a 302\n")
+    assert run(projects) == ["site-b"]
+    assert (projects / "site-a" / "_redirects_updated").read_text().split() == ["/x", "https://new.example.com/site-a", "302"]
+
+def test_touched_but_identical_input_is_skipped(projects):
+    run(projects)
+    path = projects / "site-a" / "redirects.csv"
+    os.utime(path, ns=(0, 0))
+    assert run(projects) == ["site-a", "site-b"]
+
+def test_missing_output_is_rebuilt(projects):
+    run(projects)
+    (projects / "site-b" / "redirects_diff.html").unlink()
+    assert run(projects) == ["site-a"]
+
+def test_changed_options_and_force_reprocess_everything(projects):
+    run(projects)
+    assert run(projects, "--no-pretty") == []
+    assert run(projects, "--no-pretty") == ["site-a", "site-b"]
+    assert run(projects, "--no-pretty", "--force") == []
+
+def test_failed_folder_is_retried(projects):
+    (projects / "site-b" / "_redirects").unlink()
+    with pytest.raises(subprocess.CalledProcessError):
+        run(projects)
+    manifest = json.loads((projects / ".redirects_manifest.json").read_text())
+    assert sorted(manifest["folders"]) == ["site-a"]
@@ -0,0 +1,34 @@
+import pytest
+
+from redirects_core import NormalizedUrlMap, canonical_url
+
+@pytest.mark.parametrize("url, expected", [
+    ("HTTPS://Www.Example.COM/Path", "https://www.example.com/Path"),
+    ("https://example.com:443/a", "https://example.com/a"),
+    ("http://example.com:80/a", "http://example.com/a"),
+    ("https://example.com:8443/a", "https://example.com:8443/a"),
+    ("http://example.com:443/a", "http://example.com:443/a"),
+    ("https://example.com/a/", "https://example.com/a"),
+    ("https://example.com/", "https://example.com"),
+    ("https://example.com/a/?q=1", "https://example.com/a?q=1"),
+    ("https://example.com/a/#Top", "https://example.com/a#Top"),
+    ("https://example.com/%7euser/%c3%bc", "https://example.com/~user/%C3%BC"),
+    ("/a/b/", "/a/b"),
+    ("/a%2Fb", "/a%2Fb"),
+])
+def test_canonical_form(url, expected):
+    assert canonical_url(url) == expected
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://Site.com?Page=A", "https://site.com?Page=A"),
+    ("https://Site.com:443?Page=A", "https://site.com?Page=A"),
+    ("https://Site.com#Top", "https://site.com#Top"),
+    ("https://Site.com?next=/Path", "https://site.com?next=/Path"),
+])
+def test_query_without_path_keeps_its_case(url, expected):
+    assert canonical_url(url) == expected
+
+def test_query_case_is_significant():
+    url_map = NormalizedUrlMap({canonical_url("https://site.com?page=a"): "https://new.site.com/a"})
+    assert url_map.get("https://SITE.com:443?page=a") == "https://new.site.com/a"
+    assert url_map.get("https://site.com?Page=A") is None
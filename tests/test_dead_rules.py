@@ -0,0 +1,45 @@
+from redirects_core import DROPPED, UpdateStats, pipeline_options, update_redirects
+
+def find(text, prune=False):
+    stats = UpdateStats()
+    options = pipeline_options(pretty=False, find_dead_rules=True, prune=prune)
+    output = "".join(line for line, rule in update_redirects(text.splitlines(True), {}, options, stats=stats))
+    return output, [(lineno, reason) for lineno, _, reason in stats.dead_rules]
+
+def test_duplicate_source():
+    _, dead = find("/a /x 301\n/b /y 301\n/a/ /z 301\n")
+    assert dead == [(3, "same source as line 1")]
+
+def test_covered_by_earlier_splat():
+    _, dead = find("/blog/* /news/:splat 301\n/blog/post /other 301\n/blogger /kept 301\n")
+    assert dead == [(2, "covered by /blog/* on line 1")]
+
+def test_later_splat_hides_nothing():
+    _, dead = find("/blog/post /other 301\n/blog/* /news/:splat 301\n")
+    assert dead == []
+
+def test_forced_rule_behind_unforced_one_is_alive():
+    # Without "!" the first rule is skipped when a file exists at /a, so the
+    # forced rule can still fire, and it is the one that hides line 3.
+    _, dead = find("/a /x 301\n/a /y 301!\n/a /z 301\n")
+    assert dead == [(3, "same source as line 2")]
+
+def test_conditional_and_placeholder_rules_hide_nothing():
+    _, dead = find("/a /x 302 Country=us\n/a /y 301\n/:lang/b /z 301\n/en/b /w 301\n")
+    assert dead == []
+
+def test_prune_removes_dead_rules():
+    output, dead = find("/a /x 301\n# note\n/a /y 301\n", prune=True)
+    assert output == "/a /x 301\n# note\n"
+    assert dead == [(3, "same source as line 1")]
+
+def test_report_only_keeps_rules():
+    output, _ = find("/a /x 301\n/a /y 301\n")
+    assert output == "/a /x 301\n/a /y 301\n"
+
+def test_pruned_rule_is_marked():
+    stats = UpdateStats()
+    options = pipeline_options(pretty=False, prune=True)
+    rules = [rule for _, rule in update_redirects(["/a /x 301\n", "/a /y 301\n"], {}, options, stats=stats)]
+    assert rules[0][DROPPED] is None
+    assert rules[1][DROPPED] == "same source as line 1"
@@ -0,0 +1,52 @@
+import io
+import re
+
+from redirects_core import DiffWriter, pipeline_options, rewrite_redirects, update_redirects_file, write_diff
+
+URL_MAP = {"https://old.example.com/a": "https://new.example.com/a?x=1&y=<2>"}
+RULES = "# comment\n/a https://old.example.com/a 301\n/b https://old.example.com/b 301\n"
+
+def rows(html):
+    return re.findall(r'<tr( class="chg")?><td class="n">(\d+)</td><td class="old">(.*?)</td>', html)
+
+def test_changed_rows_are_highlighted():
+    diff = io.StringIO()
+    with DiffWriter(diff) as writer:
+        for rule in rewrite_redirects(RULES.splitlines(True), URL_MAP, pipeline_options(pretty=False)):
+            writer.add(rule)
+    html = diff.getvalue()
+    assert [(bool(chg), lineno) for chg, lineno, _ in rows(html)] == [(False, "1"), (True, "2"), (False, "3")]
+    assert "https://new.example.com/a?x=1&amp;y=&lt;2&gt;" in html
+    assert "1 changed line(s) out of 3." in html
+
+def test_pruned_rule_is_a_changed_row():
+    diff = io.StringIO()
+    options = pipeline_options(pretty=False, prune=True)
+    update_redirects_file(io.StringIO("/a /x 301\n/a /y 301\n"), io.StringIO(), diff, {}, options)
+    html = diff.getvalue()
+    assert '<tr class="chg"><td class="n">2</td><td class="old">/a /y 301</td><td class="n">2</td><td class="new"></td></tr>' in html
+    assert "1 changed line(s) out of 2." in html
+
+def test_realignment_is_not_highlighted():
+    diff = io.StringIO()
+    write_diff(["/a  /x  301\n", "/b /y 301\n"], ["/a /x 301\n", "/b /z 301\n"], diff)
+    assert [(bool(chg), lineno) for chg, lineno, _ in rows(diff.getvalue())] == [(False, "1"), (True, "2")]
+
+def test_uneven_lengths_are_padded():
+    diff = io.StringIO()
+    write_diff(["/a /x 301\n"], ["/a /x 301\n", "/b /y 301\n"], diff)
+    assert "1 changed line(s) out of 2." in diff.getvalue()
+
+def test_htmldiff_engine(tmp_path):
+    diff_path = tmp_path / "diff.html"
+    options = pipeline_options(pretty=False, diff_engine="htmldiff")
+    stats = update_redirects_file(io.StringIO(RULES), io.StringIO(), str(diff_path), URL_MAP, options)
+    assert stats.replaced == 1
+    html = diff_path.read_text()
+    assert 'class="diff_chg"' in html
+    assert "Original" in html and "Updated" in html
+
+def test_diff_file_is_written(tmp_path):
+    diff_path = tmp_path / "diff.html"
+    update_redirects_file(io.StringIO(RULES), io.StringIO(), str(diff_path), URL_MAP, pipeline_options())
+    assert diff_path.read_text().endswith("</html>\n")
@@ -0,0 +1,58 @@
+import pytest
+
+from redirects_core import DomainFilter, compile_domain_filter, load_domain_file, pipeline_options, rewrite_redirects
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://www.example.com/a", True),
+    ("https://WWW.Example.com./a", True),
+    ("https://www.example.com:8443/a", True),
+    ("https://user@www.example.com/a", True),
+    ("https://www.example.com?q=1", True),
+    ("https://example.com/a", False),
+    ("https://www.example.com.evil.com/a", False),
+])
+def test_host(url, expected):
+    assert DomainFilter(["www.example.com"]).matches(url) is expected
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://shop.brand.com/a", True),
+    ("https://a.b.brand.com/a", True),
+    ("https://brand.com/a", False),
+    ("https://notbrand.com/a", False),
+])
+def test_subdomain_glob(url, expected):
+    assert DomainFilter(["*.brand.com"]).matches(url) is expected
+
+def test_fnmatch_glob():
+    domain_filter = DomainFilter(["shop-??.example.com"])
+    assert domain_filter.matches("https://shop-eu.example.com/a")
+    assert not domain_filter.matches("https://shop-eur.example.com/a")
+
+def test_url_prefix_is_matched_with_startswith():
+    domain_filter = DomainFilter(["https://old.example.com/blog"])
+    assert domain_filter.matches("https://old.example.com/blog/post")
+    assert not domain_filter.matches("https://old.example.com/shop")
+    assert not domain_filter.matches("http://old.example.com/blog/post")
+
+def test_comma_separated_and_repeated_entries():
+    domain_filter = DomainFilter(["a.com, b.com", "*.c.com", " "])
+    assert domain_filter.hosts == {"a.com", "b.com"}
+    assert domain_filter.suffixes == {".c.com"}
+
+def test_compile_domain_filter():
+    assert compile_domain_filter([]) is None
+    assert compile_domain_filter([" , "]) is None
+    assert compile_domain_filter("a.com").hosts == {"a.com"}
+    domain_filter = DomainFilter(["a.com"])
+    assert compile_domain_filter(domain_filter) is domain_filter
+
+def test_load_domain_file(tmp_path):
+    path = tmp_path / "domains.txt"
+    path.write_text("# sites\na.com\n\n  *.b.com  \n")
+    assert load_domain_file(str(path)) == ["a.com", "*.b.com"]
+
+def test_only_matching_targets_are_rewritten():
+    url_map = {"https://a.com/x": "https://new.com/x", "https://b.com/x": "https://new.com/y"}
+    lines = ["/1 https://a.com/x 301\n", "/2 https://b.com/x 301\n"]
+    rules = list(rewrite_redirects(lines, url_map, pipeline_options(domain=["a.com"])))
+    assert [rule[2][1] for rule in rules] == ["https://new.com/x", "https://b.com/x"]
@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "update_netlify_redirects.py")
+RULES = "/a https://old.example.com/a 301\n/b https://old.example.com/b 301\n"
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "redirects.csv"
+    path.write_text("old_url,new_url\nhttps://old.example.com/a,https://new.example.com/a\n")
+    return str(path)
+
+def run(csv_path, *args, stdin=RULES):
+    return subprocess.run(
+        [sys.executable, SCRIPT, "--csv", csv_path, "--no-cache", *args],
+        input=stdin, capture_output=True, text=True,
+    )
+
+@pytest.mark.parametrize("pretty", ["--pretty", "--no-pretty"])
+def test_stdin_to_stdout(csv_path, pretty):
+    result = run(csv_path, "--redirects", "-", "--output", "-", pretty)
+    assert result.returncode == 0
+    assert [line.split() for line in result.stdout.splitlines()] == [
+        ["/a", "https://new.example.com/a", "301"],
+        ["/b", "https://old.example.com/b", "301"],
+    ]
+    assert "1 replacements made." in result.stderr
+    assert "saved to stdout" in result.stderr
+
+def test_diff_to_stdout(csv_path, tmp_path):
+    output_path = tmp_path / "_redirects_updated"
+    result = run(csv_path, "--redirects", "-", "--output", str(output_path), "--diff", "-", "--report", "changes")
+    assert result.returncode == 0
+    assert result.stdout.startswith("<!DOCTYPE html>")
+    assert "https://new.example.com/a" in result.stdout
+    assert output_path.read_text().split()[:3] == ["/a", "https://new.example.com/a", "301"]
+    assert "Diff file saved to stdout" in result.stderr
+
+def test_file_output_keeps_status_on_stdout(csv_path, tmp_path):
+    output_path = tmp_path / "_redirects_updated"
+    result = run(csv_path, "--redirects", "-", "--output", str(output_path))
+    assert result.returncode == 0
+    assert "1 replacements made." in result.stdout
+    assert result.stderr == ""
+
+def test_output_and_diff_cannot_share_stdout(csv_path):
+    result = run(csv_path, "--redirects", "-", "--output", "-", "--diff", "-")
+    assert result.returncode == 2
+    assert "cannot both be written to stdout" in result.stderr
+
+def test_closed_pipe_exits_quietly(csv_path, tmp_path):
+    redirects_path = tmp_path / "_redirects"
+    redirects_path.write_text("".join(f"/{i} https://old.example.com/a 301\n" for i in range(200000)))
+    process = subprocess.Popen(
+        [sys.executable, SCRIPT, "--csv", csv_path, "--no-cache", "--redirects", str(redirects_path), "--output", "-", "--no-pretty"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+    )
+    assert process.stdout.readline().startswith("/0 ")
+    process.stdout.close()
+    stderr = process.stderr.read()
+    assert process.wait(timeout=60) == 1
+    assert "Traceback" not in stderr
@@ -0,0 +1,35 @@
+from argparse import Namespace
+
+import pytest
+
+from redirects_core import DEFAULT_COMPACT_MIN, DROPPED, pipeline_options, rewrite_redirects, UpdateStats
+
+def test_defaults():
+    options = pipeline_options()
+    assert options.pretty is True
+    assert options.prune is False
+    assert options.compact_min == DEFAULT_COMPACT_MIN
+
+def test_mapping_and_keywords():
+    options = pipeline_options({"prune": True, "pretty": False}, pretty=True)
+    assert options.prune is True
+    assert options.pretty is True
+
+def test_namespace_ignores_other_attributes():
+    options = pipeline_options(Namespace(prune=True, csv="map.csv", site_origin="https://www.example.com/"))
+    assert options.prune is True
+    assert options.site_origin == "https://www.example.com"
+    assert not hasattr(options, "csv")
+
+@pytest.mark.parametrize("bad", [{"flatten_chains": True}, {"prnue": True}])
+def test_unknown_names_raise(bad):
+    with pytest.raises(TypeError, match=next(iter(bad))):
+        pipeline_options(bad)
+    with pytest.raises(TypeError, match=next(iter(bad))):
+        pipeline_options(**bad)
+
+def test_mapping_reaches_the_pipeline():
+    stats = UpdateStats()
+    rules = list(rewrite_redirects(["/a /x 301\n", "/a /y 301\n"], {}, {"prune": True}, stats=stats))
+    assert rules[1][DROPPED] == "same source as line 1"
+    assert len(stats.dead_rules) == 1
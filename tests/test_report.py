@@ -0,0 +1,48 @@
+import io
+import re
+
+from redirects_core import ReportWriter, pipeline_options, rewrite_redirects, update_redirects_file
+
+URL_MAP = {
+    "https://old.example.com/b": "https://new.example.com/b",
+    "https://old.example.com/g": "https://new.example.com/g",
+}
+RULES = "".join(f"/{name} https://old.example.com/{name} 301\n" for name in "abcdefgh")
+
+def report(text, url_map=URL_MAP, context=0, source_map=None, **options):
+    out = io.StringIO()
+    with ReportWriter(out, context) as writer:
+        for rule in rewrite_redirects(text.splitlines(True), url_map, pipeline_options(pretty=False, **options), source_map):
+            writer.add(rule)
+    return out.getvalue()
+
+def test_only_replaced_rules_are_listed():
+    html = report(RULES)
+    assert re.findall(r'<td class="n">(\d+)</td>', html) == ["2", "7"]
+    assert '<td class="old">https://old.example.com/b</td><td class="new">https://new.example.com/b</td>' in html
+    assert "<p>2 replacement(s).</p>" in html
+    assert 'class="ctx"' not in html
+
+def test_context_lines_and_gaps():
+    html = report(RULES, context=1)
+    assert re.findall(r'<tr(?: class="(\w+)")?><td class="n">(\d+)</td>', html) == [
+        ("ctx", "1"), ("", "2"), ("ctx", "3"), ("ctx", "6"), ("", "7"), ("ctx", "8"),
+    ]
+    assert html.count('<tr class="gap">') == 1
+
+def test_overlapping_context_is_not_repeated():
+    html = report(RULES, context=4)
+    assert re.findall(r'<td class="n">(\d+)</td>', html) == [str(n) for n in range(1, 9)]
+    assert '<tr class="gap">' not in html
+
+def test_renamed_and_removed_rules():
+    html = report("/a /x 301\n/old /y 301\n/a /z 301\n", {}, source_map={"/old": "/new"}, prune=True)
+    assert "<td>/old → /new</td>" in html
+    assert "(removed: same source as line 1)" in html
+    assert "<p>0 replacement(s), 1 source(s) renamed, 1 rule(s) removed.</p>" in html
+
+def test_changes_report_through_update_redirects_file():
+    out = io.StringIO()
+    stats = update_redirects_file(io.StringIO(RULES), io.StringIO(), out, URL_MAP, pipeline_options(report="changes"))
+    assert stats.replaced == 2
+    assert "<title>Redirects Report</title>" in out.getvalue()
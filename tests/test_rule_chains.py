@@ -0,0 +1,44 @@
+from redirects_core import UpdateStats, pipeline_options, update_redirects
+
+ORIGIN = "https://www.example.com"
+
+def flatten(text, **options):
+    stats = UpdateStats()
+    options = pipeline_options(pretty=False, flatten_rules=True, site_origin=ORIGIN, **options)
+    output = "".join(line for line, rule in update_redirects(text.splitlines(True), {}, options, stats=stats))
+    return output, stats
+
+def test_chain_is_flattened():
+    output, stats = flatten("/a /b 301\n/b /c 301\n/c https://new.example.com/c 301\n")
+    assert output.splitlines()[0] == "/a  https://new.example.com/c  301"
+    assert stats.chain_hops == {2: 1, 1: 1}
+    assert stats.chains_flattened == 2
+
+def test_absolute_destination_on_origin_is_followed():
+    output, _ = flatten(f"/a {ORIGIN}/b 301\n/b /c 301\n")
+    assert output.splitlines()[0] == "/a  /c  301"
+
+def test_temporary_hops_are_not_followed():
+    output, stats = flatten("/a /b 301\n/b /c 302\n/x /a 302\n")
+    assert output.splitlines() == ["/a /b 301", "/b /c 302", "/x /a 302"]
+    assert stats.chains_flattened == 0
+
+def test_cycle_is_reported_and_left_alone():
+    output, stats = flatten("/a /b 301\n/b /a 301\n")
+    assert output.splitlines() == ["/a /b 301", "/b /a 301"]
+    assert [chain for _, chain in stats.chain_cycles] == [["/a", "/b", "/a"], ["/b", "/a", "/b"]]
+
+def test_chain_stops_at_path_an_earlier_splat_answers():
+    # Netlify answers /x/b with the splat on line 1, so /a ends at /y, not /z.
+    output, stats = flatten("/x/* /y 301\n/a /x/b 301\n/x/b /z 301\n")
+    assert output.splitlines()[1] == "/a /x/b 301"
+    assert stats.chains_flattened == 0
+
+def test_chain_stops_at_path_an_earlier_placeholder_answers():
+    output, stats = flatten("/:lang/c /y 301\n/a /k/c 301\n/k/c /z 301\n")
+    assert output.splitlines()[1] == "/a /k/c 301"
+    assert stats.chains_flattened == 0
+
+def test_later_splat_does_not_stop_chain():
+    output, _ = flatten("/a /x/b 301\n/x/b /z 301\n/x/* /y 301\n")
+    assert output.splitlines()[0] == "/a  /z  301"
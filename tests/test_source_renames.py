@@ -0,0 +1,67 @@
+from redirects_core import RENAMED, UpdateStats, pipeline_options, rewrite_redirects, rule_fields
+
+def rename(text, renames):
+    stats = UpdateStats()
+    rules = list(rewrite_redirects(text.splitlines(True), {}, pipeline_options(), source_map=renames, stats=stats))
+    return rules, stats
+
+def test_source_is_renamed():
+    rules, stats = rename("/old /x 301\n", {"/old": "/new"})
+    assert rules[0][RENAMED] == "/old"
+    assert rules[0][2][0] == "/new"
+    assert stats.sources_renamed == 1
+
+def test_rename_onto_earlier_rule_is_skipped():
+    rules, stats = rename("/new /z 301\n/old /x 301\n", {"/old": "/new"})
+    assert rules[1][RENAMED] is None
+    assert stats.sources_renamed == 0
+    assert stats.source_conflicts == [(2, "/old", "/new", 1)]
+
+def test_rename_onto_later_rule_is_skipped():
+    rules, stats = rename("/old /x 301\n/mid /y 301\n/new /z 301\n", {"/old": "/new"})
+    assert rules[0][RENAMED] is None
+    assert stats.sources_renamed == 0
+    assert stats.source_conflicts == [(1, "/old", "/new", 3)]
+
+def test_rename_onto_path_renamed_away_is_applied():
+    rules, stats = rename("/a /p 301\n/b /q 301\n", {"/a": "/b", "/b": "/c"})
+    assert [rule[RENAMED] for rule in rules] == ["/a", "/b"]
+    assert stats.sources_renamed == 2
+    assert stats.source_conflicts == []
+
+def test_two_renames_onto_one_path():
+    rules, stats = rename("/a /p 301\n/b /q 301\n", {"/a": "/c", "/b": "/c"})
+    assert [rule[RENAMED] for rule in rules] == ["/a", None]
+    assert stats.source_conflicts == [(2, "/b", "/c", 1)]
+
+def test_one_shot_iterator_is_buffered():
+    stats = UpdateStats()
+    lines = iter(["/old /x 301\n", "/new /z 301\n"])
+    rules = list(rewrite_redirects(lines, {}, pipeline_options(), source_map={"/old": "/new"}, stats=stats))
+    assert len(rules) == 2
+    assert stats.source_conflicts == [(1, "/old", "/new", 2)]
+
+def test_rejected_rename_keeps_its_path():
+    rules, stats = rename("/a /t0 301\n/c /t1 301\n/b /t2 301\n", {"/a": "/c", "/c": "/b"})
+    assert [rule_fields(rule)[0] for rule in rules] == ["/a", "/c", "/b"]
+    assert [rule[RENAMED] for rule in rules] == [None, None, None]
+    assert stats.sources_renamed == 0
+    assert stats.source_conflicts == [(1, "/a", "/c", 2), (2, "/c", "/b", 3)]
+
+def test_rejection_cascades_down_a_chain():
+    rules, stats = rename(
+        "/a /t0 301\n/b /t1 301\n/c /t2 301\n/d /t3 301\n/x /t4 301\n",
+        {"/a": "/b", "/b": "/c", "/c": "/d", "/d": "/x"},
+    )
+    assert [rule_fields(rule)[0] for rule in rules] == ["/a", "/b", "/c", "/d", "/x"]
+    assert [conflict[0] for conflict in stats.source_conflicts] == [1, 2, 3, 4]
+
+def test_rejected_rename_blocks_the_rename_that_won_its_target():
+    rules, stats = rename("/a /p 301\n/b /q 301\n/t /r 301\n/c /s 301\n", {"/a": "/t", "/b": "/t", "/t": "/c"})
+    assert [rule_fields(rule)[0] for rule in rules] == ["/a", "/b", "/t", "/c"]
+    assert stats.source_conflicts == [(1, "/a", "/t", 3), (2, "/b", "/t", 3), (3, "/t", "/c", 4)]
+
+def test_trailing_slash_rename_keeps_its_path():
+    rules, stats = rename("/b /p 301\n/a/ /q 301\n", {"/b": "/a", "/a/": "/a"})
+    assert [rule_fields(rule)[0] for rule in rules] == ["/b", "/a"]
+    assert stats.source_conflicts == [(1, "/b", "/a", 2)]
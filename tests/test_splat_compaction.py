@@ -0,0 +1,46 @@
+from redirects_core import UpdateStats, pipeline_options, update_redirects
+
+def compact(text, **options):
+    stats = UpdateStats()
+    options = pipeline_options(pretty=False, compact_splats=True, **options)
+    output = "".join(line for line, rule in update_redirects(text.splitlines(True), {}, options, stats=stats))
+    return output, stats
+
+GROUP = (
+    "/blog/a https://new.com/articles/a 301\n"
+    "/blog/b https://new.com/articles/b 301\n"
+    "/blog/c/d https://new.com/articles/c/d 301\n"
+)
+
+def test_group_becomes_one_splat_rule():
+    output, stats = compact("/start /s 301\n" + GROUP + "/end /e 301\n")
+    assert output.splitlines() == ["/start /s 301", "/blog/*  https://new.com/articles/:splat  301", "/end /e 301"]
+    assert stats.splat_groups == [(2, "/blog/*", "https://new.com/articles/:splat", 3)]
+
+def test_group_below_minimum_is_kept():
+    output, stats = compact(GROUP, compact_min=4)
+    assert [line.split() for line in output.splitlines()] == [line.split() for line in GROUP.splitlines()]
+    assert stats.splat_groups == []
+
+def test_rule_with_other_target_blocks_group():
+    output, stats = compact(GROUP + "/blog/x https://elsewhere.com/x 301\n")
+    assert stats.splat_groups == []
+    assert output.count("\n") == 4
+
+def test_forced_or_conditional_rule_blocks_group():
+    for extra in ("/blog/e https://new.com/articles/e 301!\n", "/blog/e https://new.com/articles/e 302 Country=us\n"):
+        _, stats = compact(GROUP + extra)
+        assert stats.splat_groups == []
+
+def test_later_placeholder_rule_blocks_group():
+    # The splat would sit on line 1 and answer /blog/zz before /:section/zz.
+    _, stats = compact(GROUP + "/:section/zz /z 301\n")
+    assert stats.splat_groups == []
+
+def test_existing_splat_blocks_group():
+    _, stats = compact("/blog/* /old/:splat 301\n" + GROUP)
+    assert stats.splat_groups == []
+
+def test_group_with_mixed_status_is_kept():
+    _, stats = compact(GROUP.replace("c/d 301", "c/d 302"))
+    assert stats.splat_groups == []
@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+from redirects_core import pipeline_options, update_redirects_file
+
+URL_MAP = {"https://old.example.com/a": "https://new.example.com/a"}
+RULES = "/x https://old.example.com/a 301\n/y https://old.example.com/b 301\n"
+
+@pytest.fixture
+def redirects_path(tmp_path):
+    path = tmp_path / "_redirects"
+    path.write_text(RULES)
+    return str(path)
+
+def test_output_is_written(redirects_path, tmp_path):
+    output_path = str(tmp_path / "_redirects_updated")
+    stats = update_redirects_file(redirects_path, output_path, None, URL_MAP, pipeline_options(pretty=False))
+    assert stats.replaced == 1
+    with open(output_path) as f:
+        assert f.read().split() == "/x https://new.example.com/a 301 /y https://old.example.com/b 301".split()
+
+@pytest.mark.parametrize("pretty", [False, True])
+def test_output_can_replace_the_input(redirects_path, tmp_path, pretty):
+    os.chmod(redirects_path, 0o640)
+    stats = update_redirects_file(redirects_path, redirects_path, None, URL_MAP, pipeline_options(pretty=pretty))
+    assert stats.replaced == 1
+    with open(redirects_path) as f:
+        assert f.read().split() == "/x https://new.example.com/a 301 /y https://old.example.com/b 301".split()
+    assert os.stat(redirects_path).st_mode & 0o777 == 0o640
+    assert sorted(os.listdir(tmp_path)) == ["_redirects"]
+
+def test_input_is_kept_when_the_update_fails(redirects_path, tmp_path):
+    with pytest.raises(AttributeError):
+        update_redirects_file(redirects_path, redirects_path, None, None, pipeline_options(pretty=False))
+    with open(redirects_path) as f:
+        assert f.read() == RULES
+    assert sorted(os.listdir(tmp_path)) == ["_redirects"]
@@ -0,0 +1,38 @@
+import pytest
+
+from redirects_core import FlattenedUrlMap
+
+CHAIN = {f"u{i}": f"u{i + 1}" for i in range(6)}
+
+def resolve(url_map, order, max_depth=3):
+    flattened = FlattenedUrlMap(url_map, max_depth)
+    for key in order:
+        flattened.get(key)
+    return flattened
+
+def test_chain_is_followed_to_the_end():
+    flattened = FlattenedUrlMap({"a": "b", "b": "c", "x": "a"}).resolve_all()
+    assert dict(flattened) == {"a": "c", "b": "c", "x": "c"}
+    assert flattened.cycles == []
+    assert flattened.truncated == []
+
+@pytest.mark.parametrize("order", [list(CHAIN), list(reversed(CHAIN)), ["u3", "u0", "u5", "u1", "u4", "u2"]])
+def test_depth_limit_does_not_depend_on_lookup_order(order):
+    flattened = resolve(CHAIN, order)
+    assert {key: flattened[key] for key in CHAIN} == {
+        "u0": "u3", "u1": "u4", "u2": "u5", "u3": "u6", "u4": "u6", "u5": "u6",
+    }
+    assert sorted(flattened.truncated) == ["u0", "u1", "u2"]
+
+def test_cycle_keeps_direct_targets():
+    flattened = FlattenedUrlMap({"a": "b", "b": "a", "x": "a"}).resolve_all()
+    assert flattened["a"] == "b"
+    assert flattened["b"] == "a"
+    assert flattened["x"] == "a"
+    assert flattened.cycles == [["a", "b", "a"]]
+
+def test_missing_key():
+    flattened = FlattenedUrlMap(CHAIN)
+    assert flattened.get("u6") is None
+    with pytest.raises(KeyError):
+        flattened["u6"]
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from redirects_core import CachedUrlMap, load_csv
+
+ROWS = {
+    "https://old.example.com/a": "https://new.example.com/a",
+    "https://old.example.com/ü": "https://new.example.com/ü",
+}
+
+def write_csv(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("old_url,new_url\n")
+        for old, new in rows.items():
+            f.write(f"{old},{new}\n")
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "redirects.csv"
+    write_csv(path, ROWS)
+    return str(path)
+
+def test_second_load_is_served_from_cache(csv_path, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    first = load_csv(csv_path, cache_dir=cache_dir)
+    second = load_csv(csv_path, cache_dir=cache_dir)
+    assert not isinstance(first, CachedUrlMap)
+    assert isinstance(second, CachedUrlMap)
+    assert dict(second) == ROWS
+    assert len(second) == len(ROWS)
+    assert second.get("https://old.example.com/missing") is None
+    assert "https://old.example.com/ü" in second
+    with pytest.raises(KeyError):
+        second["https://old.example.com/missing"]
+
+def test_changed_csv_invalidates_cache(csv_path, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    load_csv(csv_path, cache_dir=cache_dir)
+    changed = dict(ROWS, **{"https://old.example.com/b": "https://new.example.com/b"})
+    write_csv(csv_path, changed)
+    url_map = load_csv(csv_path, cache_dir=cache_dir)
+    assert not isinstance(url_map, CachedUrlMap)
+    assert dict(url_map) == changed
+    assert dict(load_csv(csv_path, cache_dir=cache_dir)) == changed
+
+def test_touched_csv_is_confirmed_by_hash(csv_path, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    load_csv(csv_path, cache_dir=cache_dir)
+    st = os.stat(csv_path)
+    os.utime(csv_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert isinstance(load_csv(csv_path, cache_dir=cache_dir), CachedUrlMap)
+    # The recorded mtime was refreshed, so the next load skips the hash.
+    assert load_csv(csv_path, cache_dir=cache_dir).csv_mtime_ns == st.st_mtime_ns + 10 ** 9
+
+def test_normalized_map_is_cached_separately(csv_path, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    load_csv(csv_path, cache_dir=cache_dir)
+    load_csv(csv_path, cache_dir=cache_dir, normalize=True)
+    assert len(os.listdir(cache_dir)) == 2
+
+def test_corrupt_cache_is_rebuilt(csv_path, tmp_path):
+    cache_dir = tmp_path / "cache"
+    load_csv(csv_path, cache_dir=str(cache_dir))
+    for name in os.listdir(cache_dir):
+        (cache_dir / name).write_bytes(b"garbage")
+    assert dict(load_csv(csv_path, cache_dir=str(cache_dir))) == ROWS
+    assert isinstance(load_csv(csv_path, cache_dir=str(cache_dir)), CachedUrlMap)
@@ -15,7 +15,7 @@
 # GitHub: https://github.com/ericrasch/netlify-redirect-updater
 # Date Created: 2025-04-09
 # Last Modified: 2025-04-09
-# Version: 1.1
+# Version: 1.2
 #
 # Usage:
 #   python update_netlify_redirects.py \
@@ -24,96 +24,177 @@
 #     --output _redirects_updated \
 #     --diff redirects_diff.html
 #
+#   As a filter in a pipeline (status messages go to stderr):
+#   generate_redirects | python update_netlify_redirects.py \
+#     --csv redirects.csv --redirects - --output - | deploy_redirects
+#
 # Arguments:
 #   --csv         CSV with header `old_url,new_url`
-#   --redirects   Input `_redirects` file
-#   --output      Path to write updated `_redirects` file
-#   --diff        Path to write diff HTML file
-#   --domain      (Optional) Limit updates to matching domains
+#   --redirects   Input `_redirects` file, or `-` to read it from stdin
+#   --output      Path to write updated `_redirects` file, or `-` for stdout
+#   --diff        (Optional) Path to write diff HTML file, or `-` for stdout
+#                 when --output is a file; no diff is written without it
+#   --source-csv  (Optional) CSV with header `old_path,new_path`; renames rule
+#                 sources (the from column); an extra read of the input finds
+#                 the paths in use first. A rename onto a path another rule
+#                 uses, earlier or later in the file, is skipped and reported
+#   --domain      (Optional) Limit updates to targets on these hosts. Repeat it
+#                 or comma-separate: `www.example.com`, `*.brand.com` (any
+#                 subdomain), other globs, or a `https://...` URL prefix
+#   --domain-file (Optional) File with one --domain entry per line
 #   --pretty      (Default) Align columns for readability
 #   --no-pretty   Disable column alignment
+#   --csv-engine  `csv` (default) streams rows with the csv module; `pandas`
+#                 uses pandas.read_csv (requires pandas)
+#   --cache-dir   Where compiled URL maps are cached, keyed by CSV size, mtime
+#                 and content hash (default: ~/.cache/netlify-redirect-updater)
+#   --no-cache    Disable the URL-map cache
+#   --diff-engine `linear` (default) builds the diff in a single pass over the
+#                 paired lines; `htmldiff` uses difflib.HtmlDiff (slow on large files)
+#   --report      `full` (default) diffs every line; `changes` lists only the
+#                 replaced rules (line, from, old target, new target, status)
+#   --context     Lines of context around each rule in the `changes` report
+#   --normalize-urls  Match destinations to CSV URLs in canonical form: host case,
+#                 default ports (:443/:80), trailing slashes and percent-encoding
+#                 of unreserved characters are ignored, so one CSV row covers
+#                 every variant
+#   --flatten-chains  Resolve chains in the CSV map (A->B plus B->C rewrites A
+#                 straight to C); cycles are reported and left one hop deep
+#   --max-chain-depth Maximum hops followed when flattening (default: 10)
+#   --flatten-rules   Collapse chains between rules of this `_redirects` file
+#                 (/a -> /b plus /b -> /c rewrites /a straight to /c) and print a
+#                 hop-count histogram; needs --site-origin
+#   --site-origin This site's origin (https://www.example.com); destinations on
+#                 it, and relative ones, are matched against rule sources
+#   --all-targets Also rewrite `http://` and relative destinations in the same
+#                 pass; relative ones are looked up as --site-origin + path and
+#                 written back relative if their new URL is on that origin
+#   --find-dead-rules   Report rules that can never fire: duplicates of an earlier
+#                 rule's source, or paths covered by an earlier splat rule
+#   --prune       Remove those rules from the updated file; the diff and the
+#                 changes report list what was dropped
+#   --compact-splats    Replace groups like `/blog/x  https://new.com/articles/x`
+#                 with one `/blog/*  https://new.com/articles/:splat` rule when
+#                 no other rule could match under the prefix; at least
+#                 --compact-min rules (default 3) per group. Requests under the
+#                 prefix that matched no rule before are redirected too
+#   --metrics     Write a JSON report of wall time, CPU time, peak memory
+#                 (tracemalloc) and bytes read/written per phase: load_csv,
+#                 width_pass, parse_rewrite, format, write_output, diff
+#   --profile     Directory for cProfile output: update_netlify_redirects.prof
+#                 (pstats) and .txt (top functions by cumulative time)
+#   --profile-sample  With --profile, sample stacks every N ms into a
+#                 collapsed-stack .folded file for flame graphs
+#
+# Notes:
+#   - The rewrite engine lives in redirects_core.py, which must sit next to
+#     this script
+#   - Rules read from stdin are streamed line by line with --no-pretty;
+#     pretty output, --source-csv, --flatten-rules, --compact-splats and the
+#     htmldiff engine read the input twice, so stdin is held in memory for them
 ################################################################################
 """
 
 import argparse
-import pandas as pd
-from difflib import HtmlDiff
-
-def load_csv(csv_path):
-    df = pd.read_csv(csv_path)
-    df.columns = df.columns.str.strip().str.lower()
-    return dict(zip(df.iloc[:, 0].str.strip(), df.iloc[:, 1].str.strip()))
-
-def process_redirects(redirects_path, url_map, domain_filter):
-    with open(redirects_path, "r") as f:
-        lines = f.readlines()
-
-    updated_lines = []
-    replaced = 0
-    for line in lines:
-        parts = line.strip().split()
-        if len(parts) >= 2 and parts[1].startswith("https://"):
-            target_url = parts[1].strip()
-            if (not domain_filter or target_url.startswith(domain_filter)) and target_url in url_map:
-                parts[1] = url_map[target_url]
-                replaced += 1
-            updated_line = "  ".join(parts)
-        else:
-            updated_line = line.strip()
-        updated_lines.append(updated_line + "\n")
-    return lines, updated_lines, replaced
+import os
+import sys
+from contextlib import redirect_stdout
 
-def format_redirects(lines):
-    redirects = []
-    max_from = 0
-    max_to = 0
+from redirects_core import (
+    DEFAULT_CACHE_DIR, DEFAULT_COMPACT_MIN, DEFAULT_MAX_CHAIN_DEPTH, CachedUrlMap, FlattenedUrlMap,
+    load_csv, load_domain_file, Metrics, metrics_phase, NormalizedUrlMap, print_chain_warnings,
+    print_update_stats, profiling, update_redirects_file, write_metrics,
+)
 
-    for line in lines:
-        parts = line.strip().split()
-        if len(parts) == 3 and parts[1].startswith("https://"):
-            from_url, to_url, status = parts
-            redirects.append((from_url, to_url, status))
-            max_from = max(max_from, len(from_url))
-            max_to = max(max_to, len(to_url))
-        else:
-            redirects.append(line.strip())
-
-    formatted = []
-    for item in redirects:
-        if isinstance(item, tuple):
-            from_url, to_url, status = item
-            formatted.append(f"{from_url.ljust(max_from + 2)}{to_url.ljust(max_to + 2)}{status}\n")
-        else:
-            formatted.append(item + "\n")
-    return formatted
-
-def write_diff(original, updated, diff_path):
-    html_diff = HtmlDiff(wrapcolumn=100).make_file(original, updated, fromdesc="Original", todesc="Updated")
-    with open(diff_path, "w") as f:
-        f.write(html_diff)
+__version__ = "1.2"
 
 def main():
     parser = argparse.ArgumentParser(description="Update Netlify _redirects file using a CSV map.")
     parser.add_argument("--csv", required=True, help="CSV file with old and new URLs")
-    parser.add_argument("--redirects", required=True, help="Original Netlify _redirects file")
-    parser.add_argument("--output", required=True, help="Path to write the updated _redirects file")
-    parser.add_argument("--diff", required=True, help="Path to write the HTML diff")
-    parser.add_argument("--domain", default="", help="Only replace URLs starting with this domain (optional)")
+    parser.add_argument("--redirects", required=True, help="Original Netlify _redirects file (- for stdin)")
+    parser.add_argument("--output", required=True, help="Path to write the updated _redirects file (- for stdout)")
+    parser.add_argument("--diff", help="Path to write the HTML diff (- for stdout; optional)")
+    parser.add_argument("--source-csv", help="CSV with header old_path,new_path for renaming rule sources (the from column)")
+    parser.add_argument("--domain", action="append", default=[], help="Only replace URLs on these hosts: repeat or comma-separate; `*.brand.com` globs and https:// prefixes work too (optional)")
+    parser.add_argument("--domain-file", help="File with one --domain entry per line")
     parser.add_argument("--pretty", action="store_true", default=True, help="Enable column-aligned output formatting")
     parser.add_argument("--no-pretty", dest="pretty", action="store_false", help="Disable column-aligned output formatting")
+    parser.add_argument("--csv-engine", choices=["csv", "pandas"], default="csv", help="CSV loader: streaming csv module (default) or pandas (must be installed)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help=f"Directory for compiled URL-map caches (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--no-cache", dest="cache_dir", action="store_const", const=None, help="Always re-parse the CSV")
+    parser.add_argument("--diff-engine", choices=["linear", "htmldiff"], default="linear", help="Diff generator: fast line-paired table (default) or difflib.HtmlDiff")
+    parser.add_argument("--report", choices=["full", "changes"], default="full", help="Write a full-file diff (default) or only the replaced rules")
+    parser.add_argument("--context", type=int, default=0, help="Context lines around each replaced rule in the changes report (default: 0)")
+    parser.add_argument("--normalize-urls", action="store_true", help="Match targets to CSV URLs regardless of host case, default port, trailing slash and percent-encoding")
+    parser.add_argument("--flatten-chains", action="store_true", help="Follow A->B->C chains in the CSV map so targets point straight at the final URL")
+    parser.add_argument("--max-chain-depth", type=int, default=DEFAULT_MAX_CHAIN_DEPTH, help=f"Maximum hops followed by --flatten-chains (default: {DEFAULT_MAX_CHAIN_DEPTH})")
+    parser.add_argument("--flatten-rules", action="store_true", help="Collapse chains of _redirects rules on this site so each points at its final destination")
+    parser.add_argument("--site-origin", help="This site's origin, e.g. https://www.example.com; destinations on it count as on-site")
+    parser.add_argument("--all-targets", action="store_true", help="Also rewrite http:// and relative destinations (relative ones are looked up on --site-origin)")
+    parser.add_argument("--find-dead-rules", action="store_true", help="Report rules that never fire because an earlier rule matches first")
+    parser.add_argument("--prune", action="store_true", help="Remove rules that never fire from the updated file (implies --find-dead-rules)")
+    parser.add_argument("--compact-splats", action="store_true", help="Replace groups of rules that share a source and target prefix with one splat rule")
+    parser.add_argument("--compact-min", type=int, default=DEFAULT_COMPACT_MIN, help=f"Smallest group --compact-splats replaces (default: {DEFAULT_COMPACT_MIN})")
+    parser.add_argument("--metrics", help="Write per-phase timing and memory metrics to this JSON file")
+    parser.add_argument("--profile", metavar="DIR", help="Write cProfile/pstats output for the run to this directory")
+    parser.add_argument("--profile-sample", metavar="MS", type=float, help="With --profile, also sample stacks every MS milliseconds into a collapsed-stack .folded file")
     args = parser.parse_args()
+    if args.context < 0:
+        parser.error("--context must be 0 or more")
+    if args.domain_file:
+        args.domain += load_domain_file(args.domain_file)
+    if args.flatten_rules and not args.site_origin:
+        parser.error("--flatten-rules requires --site-origin")
+    if args.site_origin:
+        args.site_origin = args.site_origin.rstrip("/")
+    if args.output == "-" and args.diff == "-":
+        parser.error("--output and --diff cannot both be written to stdout")
 
-    url_map = load_csv(args.csv)
-    original_lines, updated_lines, replaced = process_redirects(args.redirects, url_map, args.domain)
-
-    with open(args.output, "w") as f:
-        f.writelines(format_redirects(updated_lines) if args.pretty else updated_lines)
+    stdout = sys.stdout
+    try:
+        if "-" in (args.output, args.diff):
+            # stdout carries the rules (or the diff), so status goes to stderr.
+            with redirect_stdout(sys.stderr):
+                run_update(args, stdout)
+        else:
+            run_update(args, stdout)
+    except BrokenPipeError:
+        # The reader went away (`| head`); stop quietly like other filters.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
 
-    write_diff(original_lines, updated_lines, args.diff)
+def run_update(args, stdout):
+    redirects = sys.stdin if args.redirects == "-" else args.redirects
+    output = stdout if args.output == "-" else args.output
+    diff = stdout if args.diff == "-" else args.diff
+    metrics = Metrics() if args.metrics else None
+    with profiling(args.profile, "update_netlify_redirects", args.profile_sample):
+        with metrics_phase(metrics, "load_csv") as io_counts:
+            url_map = load_csv(args.csv, args.csv_engine, args.cache_dir, args.normalize_urls)
+            if not isinstance(url_map, CachedUrlMap):
+                io_counts["bytes_read"] = os.path.getsize(args.csv)
+        if args.normalize_urls:
+            url_map = NormalizedUrlMap(url_map)
+        source_map = None
+        if args.source_csv:
+            with metrics_phase(metrics, "load_source_csv"):
+                source_map = NormalizedUrlMap(load_csv(args.source_csv, args.csv_engine, args.cache_dir, normalize=True))
+        if args.flatten_chains:
+            with metrics_phase(metrics, "resolve_chains"):
+                url_map = FlattenedUrlMap(url_map, args.max_chain_depth).resolve_all()
+            print_chain_warnings(url_map)
+        stats = update_redirects_file(redirects, output, diff, url_map, args, metrics, source_map)
 
-    print(f"✅ {replaced} replacements made.")
-    print(f"📝 Updated file saved to {args.output}")
-    print(f"📊 Diff file saved to {args.diff}")
+    print_update_stats(stats, pruned=args.prune)
+    print(f"✅ {stats.replaced} replacements made.")
+    print(f"📝 Updated file saved to {'stdout' if args.output == '-' else args.output}")
+    if args.diff:
+        print(f"📊 Diff file saved to {'stdout' if args.diff == '-' else args.diff}")
+    if metrics is not None:
+        write_metrics(args.metrics, metrics.report(tool="update_netlify_redirects", version=__version__, replacements=stats.replaced))
+        print(f"⏱️  Metrics saved to {args.metrics}")
+    if args.profile:
+        print(f"🔬 Profile saved to {os.path.join(args.profile, 'update_netlify_redirects.prof')}")
 
 if __name__ == "__main__":
     main()